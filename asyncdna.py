@@ -0,0 +1,128 @@
+"""
+This module implements an asyncio northbound API client manager for DNA Center
+
+Basic Usage:
+
+  async def main():
+      async with asyncdna.AsyncDnac('https://10.0.0.1/') as dnac:
+          await dnac.login('admin', 'password')
+          print(await dnac.get('network-device/count'))
+
+  asyncio.get_event_loop().run_until_complete(main())
+
+Requests are sent over a shared connection pool. At most limit requests are
+in flight at any time, so calls can be scheduled in bulk with asyncio.gather:
+
+  ifs = await asyncio.gather(*(dnac.get('interface/network-device/' + d.id)
+                               for d in devices))
+
+Requires Python 3.5+ and aiohttp.
+"""
+
+# Author: Tim Dorssers
+
+import json
+import time
+import asyncio
+import logging
+import aiohttp
+from dna import JsonObj, TimeoutError, TaskError, HTTPError, _flatten
+
+class AsyncDnac(object):
+    """ Implements an asyncio REST API session manager for DNA Center """
+
+    def __init__(self, url, limit=10, scheme='https'):
+        # Scheme of URL is ignored, plain HTTP is only used if requested
+        self.base_url = scheme + '://' + url.rsplit('://')[-1].split('/')[0]
+        self.headers = {'Content-Type': 'application/json'}
+        self._semaphore = asyncio.Semaphore(limit)
+        # Ignore verifying the SSL certificate
+        connector = aiohttp.TCPConnector(limit=limit, ssl=False)
+        self.session = aiohttp.ClientSession(connector=connector)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        """ Closes all pooled connections """
+        await self.session.close()
+
+    async def login(self, username, passwd):
+        """ Opens session to DNA Center """
+        # Request token using HTTP basic authorization
+        response = await self.post('auth/token', ver='api/system/v1',
+                                   auth=aiohttp.BasicAuth(username, passwd))
+        # Persist authorization token for further REST requests
+        self.headers.update({'X-Auth-Token': response['Token']})
+
+    async def request(self, method, api, ver='api/v1', data=None, **kwargs):
+        """ Sends request and handles DNA Center JSON data """
+        # Construct URL, serialize data and send request
+        url = self.base_url + '/' + ver.strip('/') + '/' + api.strip('/')
+        data = json.dumps(data).encode('utf-8') if data is not None else None
+        headers = dict(self.headers, **kwargs.pop('headers', {}))
+        async with self._semaphore:
+            async with self.session.request(method, url, data=data,
+                                            headers=headers,
+                                            **kwargs) as response:
+                body = await response.read()
+        reason = response.reason
+        # Deserialize response and return JsonObj object
+        try:
+            json_obj = json.loads(body.decode('utf-8'), object_hook=JsonObj)
+        except ValueError:
+            logging.debug('Response is not JSON encoded')
+            json_obj = response  # Return aiohttp.ClientResponse instead
+        else:
+            if (400 <= response.status < 600 and isinstance(json_obj, dict)
+                    and 'response' in json_obj):
+                # Use DNA Center returned error message in case of HTTP error
+                reason = _flatten(': ', json_obj.response,
+                                  ['errorCode', 'message', 'detail'])
+        # Raise HTTPError, if one occurred
+        if 400 <= response.status < 600:
+            kind = 'Client' if response.status < 500 else 'Server'
+            raise HTTPError('%s %s Error: %s for url: %s'
+                            % (response.status, kind, reason, url))
+        return json_obj
+
+    async def get(self, api, **kwargs):
+        return await self.request('GET', api, **kwargs)
+
+    async def post(self, api, **kwargs):
+        return await self.request('POST', api, **kwargs)
+
+    async def put(self, api, **kwargs):
+        return await self.request('PUT', api, **kwargs)
+
+    async def delete(self, api, **kwargs):
+        return await self.request('DELETE', api, **kwargs)
+
+    async def wait_on_task(self, task_id, timeout=125, interval=2,
+                           backoff=1.15):
+        """ Repeatedly requests DNA Center task status until completed """
+        start_time = time.time()
+        while True:
+            # Get task status by id
+            response = await self.get('task/' + task_id)
+            if 'endTime' in response.response:  # Task has completed
+                msg = _flatten(': ', response.response,
+                               ['errorCode', 'failureReason', 'progress'])
+                # Raise exception when isError is true else log completion
+                if response.response.get('isError', False):
+                    raise TaskError(msg, response=response)
+                else:
+                    logging.info('TASK %s has completed and returned: %s'
+                                 % (task_id, msg))
+                return response
+            elif (start_time + timeout < time.time()):  # Task has timed out
+                raise TimeoutError('TASK %s did not complete within the '
+                                   'specified time-out (%s seconds)'
+                                   % (task_id, timeout))
+            logging.info('TASK %s has not completed yet. Sleeping %.1f seconds'
+                         % (task_id, interval))
+            await asyncio.sleep(interval)
+            interval *= backoff
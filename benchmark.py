@@ -0,0 +1,268 @@
+"""
+Script to benchmark the dna module and sample scripts against the simulated
+DNA Center in dnasim.py
+
+Usage: python benchmark.py [decode] [client] [tasks] [scripts] [startup]
+                           [find]
+"""
+
+import os
+import io
+import sys
+import csv
+import json
+import time
+import tempfile
+import subprocess
+import tracemalloc
+import contextlib
+import dna
+import dnac
+import events
+import dnasim
+
+PAYLOAD = ""  # Recorded JSON response file, empty for synthetic payloads
+SIZES = [10, 1000, 10000]  # Number of devices in simulated inventories
+CHUNK_SIZE = 65536
+REQUESTS = 1000  # Number of requests per client benchmark
+LATENCY = 0  # Seconds added to each simulated request
+TASK_DELAYS = [0.5, 2, 5]  # Seconds before a simulated task completes
+HOSTS = 100  # Maximum number of hosts configured by cfs-import.py
+POOLS = 16  # Number of root pools added by pool-import.py
+RUNS = 5  # Number of cold starts per startup benchmark, the median is shown
+LOOKUPS = 100  # Number of lookups per find benchmark
+
+def measure(func):
+    """ Returns wall time in seconds and peak traced memory in bytes """
+    tracemalloc.start()
+    start_time = time.time()
+    result = func()
+    elapsed = time.time() - start_time
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return elapsed, peak
+
+def header(title, *columns):
+    print(title)
+    print(("{:32}" + " {:>12}" * len(columns)).format("", *columns))
+    print('-'*72)
+
+def report(name, *values):
+    print(("{:32}" + " {:>12.3f}" * len(values)).format(name, *values))
+
+def bench_decode():
+    """ Decodes payloads into dicts, JsonObj objects and as a stream """
+    if PAYLOAD:
+        with open(PAYLOAD) as f:
+            payloads = [(PAYLOAD, f.read())]
+    else:
+        payloads = [("%d devices" % size,
+                     json.dumps({"response": [dnasim.make_device(i)
+                                              for i in range(size)],
+                                 "version": "1.0"}))
+                    for size in SIZES]
+    for name, text in payloads:
+        chunks = lambda: (text[i:i + CHUNK_SIZE]
+                          for i in range(0, len(text), CHUNK_SIZE))
+        header("Decoding %s (%.1f MB)" % (name, len(text) / 1e6),
+               "Seconds", "Peak MB")
+        for method, func in (
+                ("json.loads dict", lambda: json.loads(text)),
+                ("json.loads JsonObj",
+                 lambda: json.loads(text, object_hook=dna.JsonObj)),
+                # Streaming decode keeps only the current element alive
+                ("streaming JsonObj",
+                 lambda: sum(1 for _ in dna._iter_response(chunks())))):
+            elapsed, peak = measure(func)
+            report(method, elapsed, peak / 1e6)
+        print('='*72)
+
+def bench_client():
+    """ Measures request rate of Dnac methods """
+    for size in SIZES:
+        header("Client with %d devices" % size, "Requests/s", "Seconds")
+        with dnasim.Simulator(devices=size, latency=LATENCY) as sim:
+            with dna.Dnac(sim.url, scheme='http') as dnac:
+                dnac.login("admin", "password")
+                start_time = time.time()
+                for _ in range(REQUESTS):
+                    dnac.get("network-device/count")
+                elapsed = time.time() - start_time
+                report("get count", REQUESTS / elapsed, elapsed)
+                for name, func in (
+                        ("get_all network-device",
+                         lambda: sum(1 for _ in
+                                     dnac.get_all("network-device"))),
+                        ("iter_response network-device",
+                         lambda: sum(1 for _ in
+                                     dnac.iter_response("network-device",
+                                                        params={"limit":
+                                                                size})))):
+                    requests = sim.requests
+                    start_time = time.time()
+                    func()
+                    elapsed = time.time() - start_time
+                    report(name, (sim.requests - requests) / elapsed, elapsed)
+        print('='*72)
+
+def bench_tasks():
+    """ Compares task completion delay with time spent in wait_on_task, when
+    polling and when notified by events """
+    header("Task wait", "Delay", "Seconds", "Polls", "Notify ms")
+    for delay in TASK_DELAYS:
+        for mode in ("polling", "events"):
+            with dnasim.Simulator(task_delay=delay, latency=LATENCY) as sim, \
+                    events.EventReceiver("127.0.0.1") as receiver:
+                with dna.Dnac(sim.url, scheme='http') as dnac:
+                    dnac.login("admin", "password")
+                    if mode == "events":
+                        receiver.subscribe(dnac)
+                        dnac.events = receiver
+                    put = lambda: dnac.put(
+                        "data/customer-facing-service/DeviceInfo",
+                        ver="api/v2", data=[]).response.taskId
+                    for name, count, func in (
+                            ("wait_on_task", 1,
+                             lambda ids: dnac.wait_on_task(ids[0])),
+                            ("wait_on_tasks 10 tasks", 10,
+                             lambda ids: list(dnac.wait_on_tasks(ids)))):
+                        tasks = [put() for _ in range(count)]
+                        dnac.stats.reset()
+                        requests = sim.requests
+                        start_time = time.time()
+                        func(tasks)
+                        elapsed = time.time() - start_time
+                        summary = dnac.stats.summary()
+                        notified = summary["tasks"]["notification"]
+                        report("%s %s" % (name, mode), delay, elapsed,
+                               sim.requests - requests,
+                               notified.get("p50", 0) * 1000)
+    print('='*72)
+
+def write_csv(filename, fieldnames, rows):
+    with open(filename, "w") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames,
+                                lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+
+def cfs_rows(size):
+    """ Returns rows configuring two edge ports of each host """
+    for i in range(min(size, HOSTS)):
+        for port in (1, 2):
+            yield {"Hostname": "switch-%d.example.com" % i,
+                   "Interface": "GigabitEthernet1/0/%d" % port,
+                   "Authentication": "Closed Authentication",
+                   "Scalable group": "Employees",
+                   "Data segment": "10_25_4_0-DEFAULT_VN",
+                   "Voice segment": "10_25_6_0-DEFAULT_VN" if port == 1
+                                    else "",
+                   "Device type": "USER_DEVICE"}
+
+def pool_rows(size):
+    """ Returns rows adding root pools each having one sub pool """
+    for i in range(POOLS):
+        yield {"IP Pool Name": "Pool-%d" % i,
+               "IP Pool CIDR": "10.%d.0.0/16" % i, "Gateway": "",
+               "DHCP Servers": "", "DNS Servers": "", "Overlapping": "FALSE",
+               "Parent Pool": "", "Site": "", "Type": ""}
+        yield {"IP Pool Name": "Sub-%d" % i,
+               "IP Pool CIDR": "10.%d.1.0/24" % i,
+               "Gateway": "10.%d.1.1" % i, "DHCP Servers": "10.0.0.1",
+               "DNS Servers": "10.0.0.2", "Overlapping": "FALSE",
+               "Parent Pool": "Pool-%d" % i,
+               "Site": "Global/Site-%d" % (i % 10), "Type": "Generic"}
+
+def run_script(name, url, csvfile):
+    """ Runs command of script against simulator with output muted """
+    with contextlib.redirect_stdout(io.StringIO()):
+        dnac.main(["--host", url, "--scheme", "http", "-u", "admin", "-p",
+                   "admin", name, csvfile])
+
+def bench_scripts():
+    """ Measures wall time and peak memory of the import scripts """
+    header("Import scripts", "Requests", "Seconds", "Peak MB")
+    tmpdir = tempfile.mkdtemp()
+    for size in SIZES:
+        for name, fieldnames, rows in (
+                ("cfs-import", ["Hostname", "Interface", "Authentication",
+                                "Scalable group", "Data segment",
+                                "Voice segment", "Device type"], cfs_rows),
+                ("pool-import", ["IP Pool Name", "IP Pool CIDR", "Gateway",
+                                 "DHCP Servers", "DNS Servers", "Overlapping",
+                                 "Parent Pool", "Site", "Type"], pool_rows)):
+            csvfile = os.path.join(tmpdir, name + ".csv")
+            write_csv(csvfile, fieldnames, rows(size))
+            with dnasim.Simulator(devices=size, latency=LATENCY) as sim:
+                elapsed, peak = measure(lambda: run_script(name, sim.url,
+                                                           csvfile))
+                report("%s %d devices" % (name, size), sim.requests,
+                       elapsed, peak / 1e6)
+    print('='*72)
+
+def cold_start(args):
+    """ Returns median wall time in seconds of running a new interpreter """
+    times = []
+    for _ in range(RUNS):
+        start_time = time.time()
+        subprocess.check_call([sys.executable] + args,
+                              stdout=subprocess.DEVNULL)
+        times.append(time.time() - start_time)
+    return sorted(times)[len(times) // 2]
+
+def bench_startup():
+    """ Measures time to import modules and run a command from cold start """
+    header("Startup", "Seconds")
+    report("python", cold_start(["-c", "pass"]))
+    report("import requests", cold_start(["-c", "import requests"]))
+    report("import dna", cold_start(["-c", "import dna"]))
+    report("dnac.py --help", cold_start(["dnac.py", "--help"]))
+    with dnasim.Simulator() as sim:
+        report("dnac.py segment", cold_start(["dnac.py", "--host", sim.url,
+                                              "--scheme", "http", "-u",
+                                              "admin", "-p", "admin",
+                                              "segment"]))
+    print('='*72)
+
+def nested(size):
+    """ Returns response of projects having templates having versions """
+    return json.loads(json.dumps({"response": [
+        {"id": "project-%d" % p, "name": "Project %d" % p, "templates": [
+            {"id": "template-%d-%d" % (p, t), "name": "Template %d" % t,
+             "versionsInfo": [{"id": "version-%d-%d-%d" % (p, t, v),
+                               "version": v} for v in range(5)]}
+            for t in range(10)]} for p in range(size // 10)]}),
+        object_hook=dna.JsonObj)
+
+def bench_find():
+    """ Compares repeated find calls with lookups in a walked Index """
+    header("Find nested objects", "Lookups", "Seconds")
+    for size in SIZES:
+        response = nested(size)
+        count = size // 10 * 10 * 5
+        # Values spread evenly over the response
+        ids = ["version-%d-%d-%d" % (i * (size // 10) // LOOKUPS, i % 10,
+                                     i % 5) for i in range(LOOKUPS)]
+        start_time = time.time()
+        for val in ids:
+            dna.find(response, val)
+        report("find %d versions" % count, LOOKUPS, time.time() - start_time)
+        start_time = time.time()
+        index = dna.Index.walk(response)
+        for val in ids:
+            index.find_all("id", val, paths=True)
+        report("Index.walk %d versions" % count, LOOKUPS,
+               time.time() - start_time)
+    print('='*72)
+
+def main():
+    sections = {"decode": bench_decode, "client": bench_client,
+                "tasks": bench_tasks, "scripts": bench_scripts,
+                "startup": bench_startup, "find": bench_find}
+    for name in sys.argv[1:] or ["decode", "client", "tasks", "scripts",
+                                 "startup", "find"]:
+        sections[name]()
+
+if __name__ == "__main__":
+    main()
@@ -1,119 +1,253 @@
 """ Script to configure Campus fabric edge ports from a csv file """
 
-from __future__ import print_function
 import logging
 import json
-import csv
+import copy
+from collections import OrderedDict
+import sys
 import dna
+import ingest
+import journal
+from multiprocessing.pool import ThreadPool
 
-HOST = ""
-USERNAME = ""
-PASSWORD = ""
-CSVFILE = "cfs-import.csv"
-DELIMIT = ","
-LOGGING = True
+# Fields of device interface info set by this script, other fields are
+# populated by DNA Center
+FIELDS = ("authenticationProfileId", "scalableGroupId", "connectedDeviceType",
+          "role")
 
-def lookup(list_dicts, key, val):
-    """ Find key by value in list of dicts and return dict """
-    if val == "":
-        return None
-    r = next((d for d in list_dicts if d[key] == val), None)
-    if r is None:
-        raise(ValueError(val + " not found"))
-    return r
+def managed(dii):
+    """ Returns fields of device interface info set by this script """
+    fields = dict((key, dii.get(key)) for key in FIELDS)
+    fields["segment"] = [s.get("idRef") for s in dii.get("segment") or []]
+    return fields
 
-def main():
-    if LOGGING:
-        logging.basicConfig(level=logging.DEBUG,
-                            format='%(asctime)s - %(levelname)s - %(message)s')
-    with open(CSVFILE) as csvfile:
-        rows = [row for row in csv.DictReader(csvfile, delimiter=DELIMIT)]
-    with dna.Dnac(HOST) as dnac:
-        dnac.login(USERNAME, PASSWORD)
-        # Get devices, auth templates, scalable groups and segments
-        devices = dnac.get("network-device")
-        sps = dnac.get("siteprofile", params={"populated": "true"}).response
-        sgts = dnac.get("data/customer-facing-service/scalablegroup",
-                        ver="api/v2").response
-        segments = dnac.get("data/customer-facing-service/Segment",
-                            ver="api/v2").response
-        # Iterate unique hostnames
-        for host in set(r["Hostname"] for r in rows if r["Hostname"] != ""):
-            print("Host:", host)
-            removed = []
-            updated = []
-            added = []
-            # Lookup device matching hostname
-            device = dna.find(devices, host, "hostname")
-            # Get interfaces and device info
-            ifs = dnac.get("interface/network-device/" + device.id).response
+def diff(old, new):
+    """ Returns list of changed fields of device interface info """
+    old, new = managed(old), managed(new)
+    return ["%s: %s -> %s" % (key, json.dumps(old[key]), json.dumps(new[key]))
+            for key in sorted(old) if old[key] != new[key]]
+
+def plan(dnac, host, rows, devices, sps, sgts, segments):
+    """ Computes desired device info of one host and returns it along with
+    summary of changes compared to its current device info. Rows are line
+    number and row tuples, errors of rows are returned in the summary """
+    removed = []
+    updated = []
+    added = []
+    unchanged = []
+    details = []
+    errors = []
+    # Lookup device matching hostname
+    device = devices.lookup("hostname", host)
+    # Get interfaces and device info
+    ifs = dna.Index(dnac.get("interface/network-device/" + device.id).response)
+    try:
+        # DNAC 1.1 uses network device id as cfs name
+        di = dnac.get("data/customer-facing-service/DeviceInfo", ver="api/v2",
+                      params={"name": device.id}).response[0]
+    except IndexError:
+        # DNAC 1.2 uses network device hostname as cfs name
+        di = dnac.get("data/customer-facing-service/DeviceInfo", ver="api/v2",
+                      params={"name": device.hostname}).response[0]
+    # Map interface ids to device interface info, preserving order
+    infos = OrderedDict((dii.interfaceId, dii)
+                        for dii in di.deviceInterfaceInfo)
+    # Iterate csv file rows for this host
+    seen = set()
+    for line, row in rows:
+        # Lookup objects matching name specified in csv file rows
+        interface = ifs.get("portName", row["Interface"])
+        if interface is None or interface.id in seen:
+            problem = "not found" if interface is None else "repeated"
+            errors.append((line, "Interface %s %s" % (row["Interface"],
+                                                      problem)))
+            continue
+        seen.add(interface.id)
+        auth = sps.lookup("name", row["Authentication"])
+        sgt = sgts.lookup("name", row["Scalable group"])
+        segment = segments.lookup("name", row["Data segment"])
+        voice = segments.lookup("name", row["Voice segment"])
+        # Pop interface info from map and store in data dict
+        data = infos.pop(interface.id, None)
+        original = None
+        # Remove interface action if no values are specified
+        if not any((auth, sgt, segment, voice)):
+            if data is None:  # Removed already
+                unchanged.append(interface.portName)
+                continue
+            removed.append(interface.portName)
+            data = None
+        # Update interface action if id is found in list
+        elif data is not None:
+            original = copy.deepcopy(data)
+            # Clear fields
+            data.segment = []
+            data.pop("authenticationProfile", None)
+            data.pop("authenticationProfileId", None)
+            data.pop("scalableGroupId", None)
+            data.pop("connectedDeviceType", None)
+        # Add interface
+        else:
+            added.append(interface.portName)
+            data = dna.JsonObj({"interfaceId": interface.id,
+                                "role": "LAN",
+                                "segment": []})
+        # Update fields
+        if auth is not None:
+            data.authenticationProfileId = auth.siteProfileUuid
+        if segment is not None:
+            data.segment.append({"idRef": segment.id})
+        if voice is not None:
+            data.segment.append({"idRef": voice.id})
+        if sgt is not None:
+            data.scalableGroupId = sgt.id
+        if row["Device type"] != "":
+            data.connectedDeviceType = row["Device type"]
+        # Compare updated interface with its original
+        if original is not None:
+            changes = diff(original, data)
+            if changes:
+                updated.append(interface.portName)
+                details.extend(interface.portName + " " + change
+                               for change in changes)
+            else:
+                unchanged.append(interface.portName)
+                data = original  # Keep fields populated by DNA Center
+        # Save in device interface info map
+        if data is not None:
+            infos[interface.id] = data
+    di.deviceInterfaceInfo = list(infos.values())
+    return di, {"removed": removed, "updated": updated, "added": added,
+                "unchanged": unchanged, "details": details, "errors": errors}
+
+def configure(dnac, jrnl, host, di, summary, dry_run=False):
+    """ Commits planned device info of one host and returns summary of
+    changes. Hosts without changes are skipped, unless a task of a previous
+    run is still to be polled """
+    summary["seconds"] = None
+    if dry_run or not (summary["removed"] or summary["updated"]
+                       or summary["added"] or jrnl.task(host, "put")):
+        return summary
+    # Commit changes
+    logging.debug("data=" + json.dumps([di]))
+    task_result = jrnl.run_task(dnac, host, "put", lambda: dnac.put(
+        "data/customer-facing-service/DeviceInfo", ver="api/v2", data=[di]))
+    jrnl.record(host, "completed")
+    summary["seconds"] = float(task_result.endTime
+                               - task_result.startTime) / 1000
+    return summary
+
+def add_arguments(parser):
+    """ Adds command line arguments of this script """
+    parser.add_argument("csvfile", nargs="?", default="cfs-import.csv")
+    parser.add_argument("--delimiter", default=",")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="number of hosts configured in parallel")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="report changes without committing them")
+    parser.add_argument("--chunk-size", type=int, default=10000,
+                        help="number of csv file rows validated at once")
+    parser.add_argument("--journal", help="journal file of submitted tasks "
+                                          "and outcomes, defaults to csv "
+                                          "file name with .journal appended")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip hosts completed by a previous run and "
+                             "poll its unfinished tasks again")
+
+def run(dnac, args):
+    # Get devices, auth templates, scalable groups and segments
+    devices = dna.Index(dnac.get_all("network-device"))
+    sps = dna.Index(dnac.get("siteprofile",
+                             params={"populated": "true"}).response)
+    sgts = dna.Index(dnac.get("data/customer-facing-service/scalablegroup",
+                              ver="api/v2").response)
+    segments = dna.Index(dnac.get("data/customer-facing-service/Segment",
+                                  ver="api/v2").response)
+    # Validate csv file rows in chunks and group them by unique hostname
+    rows = ingest.Ingest(args.csvfile, "Hostname", args.delimiter,
+                         args.chunk_size)
+    rows.reference("Hostname", devices, "hostname")
+    rows.reference("Authentication", sps, "name")
+    rows.reference("Scalable group", sgts, "name")
+    rows.reference("Data segment", segments, "name")
+    rows.reference("Voice segment", segments, "name")
+    rows.run()
+    if rows.errors:
+        rows.report()
+        return
+    hosts = rows.groups
+    hosts.pop("", None)
+    # Hosts completed by a previous run are skipped
+    jrnl = journal.Journal(args.journal or args.csvfile + ".journal",
+                           args.resume)
+    completed = [host for host in hosts if jrnl.completed(host)]
+    for host in completed:
+        del hosts[host]
+    if completed:
+        print("Skipped %d hosts completed by previous run" % len(completed))
+    def prepare(host):
+        try:
+            return host, plan(dnac, host, hosts[host], devices, sps, sgts,
+                              segments)
+        except Exception as e:
+            return host, e
+    pool = ThreadPool(args.workers)
+    try:
+        # Plan all hosts before committing changes of any host
+        plans = {}
+        for host, result in pool.imap_unordered(prepare, hosts):
+            if isinstance(result, Exception):
+                rows.error(hosts[host][0][0], "%s %s" % (host, result))
+                continue
+            plans[host] = result
+            for line, message in result[1]["errors"]:
+                rows.error(line, message)
+        if rows.errors:
+            rows.report()
+            return
+        def worker(host):
             try:
-                # DNAC 1.1 uses network device id as cfs name
-                di = dnac.get("data/customer-facing-service/DeviceInfo", ver="api/v2",
-                              params={"name": device.id}).response[0]
-            except IndexError:
-                # DNAC 1.2 uses network device hostname as cfs name
-                di = dnac.get("data/customer-facing-service/DeviceInfo", ver="api/v2",
-                              params={"name": device.hostname}).response[0]
-            # Iterate csv file rows for this host
-            for row in [r for r in rows if r["Hostname"] == host]:
-                data = None
-                # Lookup objects matching name specified in csv file rows
-                interface = lookup(ifs, "portName", row["Interface"])
-                auth = lookup(sps, "name", row["Authentication"])
-                sgt = lookup(sgts, "name", row["Scalable group"])
-                segment = lookup(segments, "name", row["Data segment"])
-                voice = lookup(segments, "name", row["Voice segment"])
-                # Pop interface info from list and store in data dict
-                for idx, dii in enumerate(di.deviceInterfaceInfo):
-                    if dii.interfaceId == interface.id:
-                        data = di.deviceInterfaceInfo.pop(idx)
-                        break
-                # Remove interface action if no values are specified
-                if not any((auth, sgt, segment, voice)):
-                    removed.append(interface.portName)
-                    if data is None:
-                        raise(ValueError(interface.portName + " not in cfs"))
-                    data = None
-                # Update interface action if id is found in list
-                elif data is not None:
-                    updated.append(interface.portName)
-                    # Clear fields
-                    data.segment = []
-                    data.pop("authenticationProfile", None)
-                    data.pop("scalableGroupId", None)
-                    data.pop("connectedDeviceType", None)
-                # Add interface
-                else:
-                    added.append(interface.portName)
-                    data = dna.JsonObj({"interfaceId": interface.id,
-                                        "role": "LAN",
-                                        "segment": []})
-                # Update fields
-                if auth is not None:
-                    data.authenticationProfileId = auth.siteProfileUuid
-                if segment is not None:
-                    data.segment.append({"idRef": segment.id})
-                if voice is not None:
-                    data.segment.append({"idRef": voice.id})
-                if sgt is not None:
-                    data.scalableGroupId = sgt.id
-                if row["Device type"] != "":
-                    data.connectedDeviceType = row["Device type"]
-                # Save in device interface info list
-                if data is not None:
-                    di.deviceInterfaceInfo.append(data)
-            print("Removed:", *removed)
-            print("Updated:", *updated)
-            print("Added:", *added)
-            # Commit changes
-            logging.debug("data=" + json.dumps([di]))
-            response = dnac.put("data/customer-facing-service/DeviceInfo",
-                                ver="api/v2", data=[di]).response
-            print("Waiting for Task")
-            task_result = dnac.wait_on_task(response.taskId).response
-            print("Completed in %s seconds" % (float(task_result.endTime
-                                               - task_result.startTime) / 1000))
+                return host, configure(dnac, jrnl, host, plans[host][0],
+                                       plans[host][1], args.dry_run)
+            except Exception as e:
+                return host, e
+        # Configure hosts in parallel
+        totals = {"removed": 0, "updated": 0, "added": 0, "unchanged": 0}
+        failed = []
+        skipped = []
+        for host, result in pool.imap_unordered(worker, hosts):
+            # Print summary of each host as a whole when it has completed
+            print("Host:", host)
+            if isinstance(result, Exception):
+                print("Failed:", result)
+                failed.append(host)
+                continue
+            print("Removed:", *result["removed"])
+            print("Updated:", *result["updated"])
+            print("Added:", *result["added"])
+            print("Unchanged:", *result["unchanged"])
+            if args.dry_run:
+                for detail in result["details"]:
+                    print("  " + detail)
+            if result["seconds"] is not None:
+                print("Completed in %s seconds" % result["seconds"])
+            else:
+                print("Not committed" if args.dry_run else "No changes")
+                skipped.append(host)
+            for key in totals:
+                totals[key] += len(result[key])
+    finally:
+        pool.terminate()
+        jrnl.close()
+    print('='*80)
+    print("Hosts: %d configured, %d skipped, %d failed"
+          % (len(hosts) - len(skipped) - len(failed), len(skipped),
+             len(failed)))
+    print("Interfaces: %(removed)d removed, %(updated)d updated, "
+          "%(added)d added, %(unchanged)d unchanged" % totals)
+    if failed:
+        print("Failed:", *sorted(failed))
 
 if __name__ == "__main__":
-    main()
+    import dnac as cli
+    cli.main(sys.argv[1:], "cfs-import")
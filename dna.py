@@ -13,26 +13,87 @@ Or as a context manager:
   with dna.Dnac('https://10.0.0.1/') as dnac:
       dnac.login('admin', 'password')
       print(dnac.get('network-device/count'))
+
+Large inventories are retrieved page by page:
+
+  for device in dnac.get_all('network-device'):
+      print(device.hostname)
+
+Nested objects of a response are indexed in a single pass:
+
+  index = dna.Index.walk(dnac.get('template-programmer/project'))
+  for path, template in index.find_all('name', 'Banner', paths=True):
+      print(path, template.id)
 """
 
 # Author: Tim Dorssers
 
+import os
+import re
 import json
+import math
 import time
 import logging
-import requests
-from requests import HTTPError
+import threading
+from contextlib import closing
+from collections import OrderedDict
 
-requests.packages.urllib3.disable_warnings()  # Disable warnings
+_create_lock = threading.Lock()  # Guards creation of the Dnac class
 
-class Dnac(requests.Session):
-    """ Implements a REST API session manager for DNA Center """
+def __getattr__(name):
+    """ Imports requests and creates the Dnac class on first use, so that
+    importing this module stays fast. Requires Python 3.7+ """
+    global requests, HTTPError, Dnac
+    if name not in ('Dnac', 'HTTPError'):
+        raise AttributeError('module %r has no attribute %r'
+                             % (__name__, name))
+    with _create_lock:
+        # Another thread may have created the class while this one waited
+        if 'Dnac' not in globals():
+            import requests
+            from requests import HTTPError
+            requests.packages.urllib3.disable_warnings()  # Disable warnings
+            Dnac = type('Dnac', (_Client, requests.Session),
+                        {'__doc__': _Client.__doc__, '__module__': __name__})
+    return globals()[name]
 
-    def __init__(self, url):
-        super(Dnac, self).__init__()
-        self.base_url = 'https://' + url.rsplit('://')[-1].split('/')[0]
+class _Client(object):
+    """ Implements a REST API session manager for DNA Center. It is combined
+    with requests.Session into class Dnac """
+
+    # Methods safe to retry after a server error or connection failure
+    idempotent = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+    def __init__(self, url, cache=None, rate=None, retries=3, pool_size=10,
+                 keepalive=True, events=None, scheme='https'):
+        from requests.adapters import HTTPAdapter
+        super(_Client, self).__init__()
+        # Connection pool size for concurrent use of the session
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        if not keepalive:
+            self.headers.update({'Connection': 'close'})
+        # Scheme of URL is ignored, plain HTTP is only used if requested by
+        # scheme, for instance to connect to the simulator in dnasim.py
+        self.base_url = scheme + '://' + url.rsplit('://')[-1].split('/')[0]
         self.headers.update({'Content-Type': 'application/json'})
         self.verify = False  # Ignore verifying the SSL certificate
+        # Optional cache of GET responses, given as ResponseCache or directory
+        if isinstance(cache, str):
+            cache = ResponseCache(cache) if cache else None
+        self.cache = cache
+        self.stats = Stats()  # Request and task metrics
+        # Optional request rate limit, given as RateLimiter or requests/sec
+        if isinstance(rate, (int, float)):
+            rate = RateLimiter(rate)
+        self.limiter = rate
+        self.retries = retries
+        # Optional events.EventReceiver notified of task completion
+        self.events = events
+        # Task id mapped to resource family changed once the task completes
+        self._families = {}
 
     def login(self, username, passwd):
         """ Opens session to DNA Center """
@@ -47,8 +108,112 @@ class Dnac(requests.Session):
         # Construct URL, serialize data and send request
         url = self.base_url + '/' + ver.strip('/') + '/' + api.strip('/')
         data = json.dumps(data).encode('utf-8') if data is not None else None
-        response = super(Dnac, self).request(method, url, data=data, **kwargs)
-        # Deserialize response and return JsonObj object
+        if self.cache is None:
+            response = self._send(method, url, data=data, **kwargs)
+        elif method.upper() == 'GET':
+            return self._cached_request(url, ver, api, data=data, **kwargs)
+        else:
+            family = _family(ver, api)
+            try:
+                response = self._send(method, url, data=data, **kwargs)
+            finally:
+                # Mutating call invalidates cached responses of same family
+                self.cache.invalidate(family)
+            json_obj = self._decode(response)
+            # Change is applied by a task, responses cached until it
+            # completes are invalidated again by _poll_task
+            task = (json_obj.get('response') if isinstance(json_obj, dict)
+                    else None)
+            if isinstance(task, dict) and 'taskId' in task:
+                self._families[task['taskId']] = family
+            return json_obj
+        return self._decode(response)
+
+    def _cached_request(self, url, ver, api, **kwargs):
+        """ Returns cached response if fresh, otherwise sends (conditional)
+        GET request and caches the response """
+        ttl = self.cache.ttl_of(ver, api)
+        if not ttl or kwargs.get('stream'):
+            return self._decode(self._send('GET', url, **kwargs))
+        key = self.cache.key(url, kwargs.get('params'), _family(ver, api))
+        entry = self.cache.load(key)
+        if entry is not None and entry['time'] + ttl > time.time():
+            logging.debug('Cache hit for ' + url)
+            self.cache.touch(key)
+            return json.loads(entry['body'], object_hook=JsonObj)
+        # Revalidate stale entry using validators returned by server
+        headers = dict(kwargs.pop('headers', None) or {})
+        if entry is not None and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry is not None and entry.get('modified'):
+            headers['If-Modified-Since'] = entry['modified']
+        response = self._send('GET', url, headers=headers, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            logging.debug('Cache revalidated for ' + url)
+            entry['time'] = time.time()
+            self.cache.store(key, entry)
+            return json.loads(entry['body'], object_hook=JsonObj)
+        json_obj = self._decode(response)
+        if response.status_code == 200 and isinstance(json_obj, (dict, list)):
+            self.cache.store(key, {'url': url, 'family': _family(ver, api),
+                                   'time': time.time(), 'body': response.text,
+                                   'etag': response.headers.get('ETag'),
+                                   'modified':
+                                   response.headers.get('Last-Modified')})
+        return json_obj
+
+    def _send(self, method, url, **kwargs):
+        """ Sends request using base class method, records metrics and
+        retries throttled requests and failed idempotent requests """
+        endpoint = self._endpoint(method, url)
+        idempotent = method.upper() in self.idempotent
+        data = kwargs.get('data')
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire(_family(*_split(endpoint.split()[1])))
+            start_time = time.time()
+            try:
+                response = super(_Client, self).request(method, url, **kwargs)
+            except requests.ConnectionError as e:
+                if not idempotent or attempt >= self.retries:
+                    raise
+                delay = _backoff(attempt)
+                logging.info('%s failed: %s. Retrying in %.1f seconds'
+                             % (endpoint, e, delay))
+            else:
+                elapsed = time.time() - start_time
+                if kwargs.get('stream'):  # Body is not read yet
+                    size = int(response.headers.get('Content-Length', 0))
+                else:
+                    size = len(response.content)
+                self.stats.record_request(endpoint, elapsed,
+                                          response.status_code,
+                                          len(data) if data else 0, size)
+                # Throttled requests were not processed by the controller
+                if not (response.status_code == 429 or idempotent and
+                        response.status_code in (502, 503, 504)):
+                    return response
+                if attempt >= self.retries:
+                    return response
+                delay = _retry_after(response)
+                if delay is None:
+                    delay = _backoff(attempt)
+                logging.info('%s returned HTTP %d. Retrying in %.1f seconds'
+                             % (endpoint, response.status_code, delay))
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def _endpoint(self, method, url):
+        """ Returns method and API path of URL with ids replaced by {id} """
+        path = url[len(self.base_url):].split('?')[0]
+        return method.upper() + ' ' + re.sub(r'/[0-9a-fA-F-]{8,}(?=/|$)',
+                                             '/{id}', path)
+
+    def _decode(self, response):
+        """ Deserializes response and returns JsonObj object """
+        start_time = time.time()
         try:
             json_obj = response.json(object_hook=JsonObj)
         except ValueError:
@@ -59,34 +224,176 @@ class Dnac(requests.Session):
                 # Use DNA Center returned error message in case of HTTP error
                 response.reason = _flatten(': ', json_obj.response,
                                            ['errorCode', 'message', 'detail'])
+        self.stats.record_decode(self._endpoint(response.request.method,
+                                                response.url),
+                                 time.time() - start_time)
         response.raise_for_status()  # Raise HTTPError, if one occurred
         return json_obj
 
+    def iter_response(self, api, ver='api/v1', chunk_size=65536, **kwargs):
+        """ Sends GET request and yields the elements of the response array
+        one at a time while the body is decoded incrementally """
+        url = self.base_url + '/' + ver.strip('/') + '/' + api.strip('/')
+        response = self._send('GET', url, stream=True, **kwargs)
+        with closing(response):
+            if response.status_code >= 400:
+                self._decode(response)  # Raise HTTPError with error message
+            response.encoding = response.encoding or 'utf-8'
+            for obj in _iter_response(response.iter_content(
+                    chunk_size, decode_unicode=True)):
+                yield obj
+
+    def iter_pages(self, api, ver='api/v1', limit=500, count=False,
+                   params=None, **kwargs):
+        """ Yields pages of a paginated GET request while prefetching the next
+        page in the background. The total number of items is requested from
+        the count endpoint first, if count is true, and pages are fetched
+        until that many items are read, as the server may return fewer items
+        per page than limit. Otherwise a page having fewer items than limit
+        is assumed to be the last one """
+        params = dict(params or {})
+        offset = int(params.pop('offset', 1))  # DNA Center offsets start at 1
+        total = None
+        if count:
+            total = self.get(api.rstrip('/') + '/count', ver=ver,
+                             params=params, **kwargs).response
+        def fetch(offset):
+            return self.get(api, ver=ver, params=dict(params, offset=offset,
+                                                      limit=limit), **kwargs)
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(1)
+        try:
+            pending = pool.apply_async(fetch, (offset,))
+            while pending is not None:
+                page = pending.get()  # Reraises exception of fetch, if any
+                offset += len(page.response)
+                pending = None
+                # Prefetch next page unless this page is the last one
+                if total is not None:
+                    more = page.response and offset <= total
+                else:
+                    more = len(page.response) == limit
+                if more:
+                    pending = pool.apply_async(fetch, (offset,))
+                yield page
+        finally:
+            pool.terminate()
+
+    def get_all(self, api, ver='api/v1', limit=500, count=False, **kwargs):
+        """ Yields items of all pages of a paginated GET request one by one """
+        for page in self.iter_pages(api, ver, limit, count, **kwargs):
+            for item in page.response:
+                yield item
+
     def wait_on_task(self, task_id, timeout=125, interval=2, backoff=1.15):
-        """ Repeatedly requests DNA Center task status until completed """
+        """ Repeatedly requests DNA Center task status until completed, or
+        until notified of completion if an event receiver is set """
         start_time = time.time()
         while True:
             # Get task status by id
-            response = self.get('task/' + task_id)
-            if 'endTime' in response.response:  # Task has completed
-                msg = _flatten(': ', response.response,
-                               ['errorCode', 'failureReason', 'progress'])
-                # Raise exception when isError is true else log completion
-                if response.response.get('isError', False):
-                    raise TaskError(msg, response=response)
-                else:
-                    logging.info('TASK %s has completed and returned: %s'
-                                 % (task_id, msg))
+            response = self._poll_task(task_id, start_time)
+            if response is not None:  # Task has completed
                 return response
             elif (start_time + timeout < time.time()):  # Task has timed out
                 raise TimeoutError('TASK %s did not complete within the '
                                    'specified time-out (%s seconds)'
                                    % (task_id, timeout))
-            logging.info('TASK %s has not completed yet. Sleeping %d seconds'
-                         % (task_id, interval))
-            time.sleep(int(interval))
+            logging.info('TASK %s has not completed yet. Sleeping %.1f '
+                         'seconds' % (task_id, interval))
+            self._sleep([task_id], interval)
             interval *= backoff
 
+    def wait_on_tasks(self, task_ids, timeout=125, interval=2, backoff=1.15,
+                      workers=8, raise_errors=True):
+        """ Polls multiple DNA Center tasks concurrently and yields (task id,
+        response) tuples in order of completion. A failed or timed out task
+        raises its exception or, if raise_errors is false, the exception is
+        yielded in place of the response """
+        start_time = time.time()
+        # Each task keeps its own next poll time and backoff interval
+        pending = dict((task_id, (start_time, interval))
+                       for task_id in task_ids)
+        def poll(task_id):
+            try:
+                return task_id, self._poll_task(task_id, start_time)
+            except TaskError as e:
+                return task_id, e
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(workers)
+        try:
+            while pending:
+                now = time.time()
+                due = [task_id for task_id, (next_time, _) in pending.items()
+                       if next_time <= now]
+                for task_id, result in pool.imap_unordered(poll, due):
+                    if result is None:
+                        next_interval = pending[task_id][1]
+                        if start_time + timeout < time.time():
+                            del pending[task_id]
+                            result = TimeoutError('TASK %s did not complete '
+                                                  'within the specified '
+                                                  'time-out (%s seconds)'
+                                                  % (task_id, timeout))
+                        else:  # Task has not completed yet
+                            pending[task_id] = (time.time() + next_interval,
+                                                next_interval * backoff)
+                            continue
+                    else:
+                        del pending[task_id]
+                    if raise_errors and isinstance(result, Exception):
+                        raise result
+                    yield task_id, result
+                if pending:
+                    delay = min(t for t, _ in pending.values()) - time.time()
+                    logging.info('%d TASKS have not completed yet. Sleeping '
+                                 '%.1f seconds'
+                                 % (len(pending), max(delay, 0)))
+                    # Notified tasks are polled right away
+                    for task_id in self._sleep(list(pending), max(delay, 0)):
+                        pending[task_id] = (0, pending[task_id][1])
+        finally:
+            pool.terminate()
+
+    def _sleep(self, task_ids, seconds):
+        """ Sleeps for seconds or, if an event receiver is set, until any of
+        the tasks is notified of completion. Sleeps longer while notifications
+        are being received. Returns list of notified task ids """
+        sleep_time = time.time()
+        notified = []
+        if self.events is None:
+            time.sleep(seconds)
+        else:
+            for task_id, latency in self.events.wait(
+                    task_ids, self.events.fallback(seconds)):
+                self.stats.record_notification(task_id, latency)
+                notified.append(task_id)
+        for task_id in task_ids:
+            self.stats.record_sleep(task_id, time.time() - sleep_time)
+        return notified
+
+    def _poll_task(self, task_id, start_time):
+        """ Returns task status response when completed or None otherwise """
+        poll_time = time.time()
+        response = self.get('task/' + task_id)
+        self.stats.record_poll(task_id, time.time() - poll_time)
+        if 'endTime' in response.response:  # Task has completed
+            family = self._families.pop(task_id, None)
+            if family is not None and self.cache is not None:
+                self.cache.invalidate(family)
+            task = response.response
+            duration = task.endTime - task.get('startTime', task.endTime)
+            self.stats.record_task(task_id, float(duration) / 1000,
+                                   time.time() - start_time)
+            msg = _flatten(': ', response.response,
+                           ['errorCode', 'failureReason', 'progress'])
+            # Raise exception when isError is true else log completion
+            if response.response.get('isError', False):
+                raise TaskError(msg, response=response)
+            else:
+                logging.info('TASK %s has completed and returned: %s'
+                             % (task_id, msg))
+            return response
+
 class TimeoutError(Exception):
     """ Custom exception raised when a task has timed out """
     pass
@@ -101,6 +408,7 @@ class TaskError(Exception):
 class JsonObj(dict):
     """ Dictionary with attribute access """
 
+    __slots__ = ()  # No per instance attribute dictionary
     __setattr__ = dict.__setitem__
     __delattr__ = dict.__delitem__
 
@@ -115,23 +423,518 @@ class JsonObj(dict):
         """ Serialize object to JSON formatted string with indents """
         return json.dumps(self, indent=4)
 
+class RateLimiter(object):
+    """ Token buckets limiting the request rate per API resource family.
+    Rates of specific families are overridden by rates """
+
+    def __init__(self, rate, burst=None, rates=None):
+        self.rate = rate  # Requests per second
+        self.burst = burst or max(1, rate)
+        self.rates = rates or {}
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def acquire(self, family):
+        """ Takes a token from the bucket of family, waits if empty """
+        rate = self.rates.get(family, self.rate)
+        now = time.time()
+        with self.lock:
+            tokens, last = self.buckets.get(family, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * rate) - 1
+            # A negative token count reserves tokens for waiting callers
+            self.buckets[family] = (tokens, now)
+        if tokens < 0:
+            time.sleep(-tokens / rate)
+
+class Histogram(object):
+    """ Counts values in buckets growing by a fixed factor, so that memory
+    use is bounded and percentiles are estimated within that factor """
+
+    factor = 1.1
+    smallest = 1e-6  # Upper bound of the first bucket
+
+    def __init__(self):
+        self.buckets = {}  # Bucket number mapped to count of values
+        self.count = 0
+        self.total = 0.0
+        self.min = self.max = None
+
+    def add(self, value):
+        bucket = 0
+        if value > self.smallest:
+            bucket = int(math.ceil(math.log(value / self.smallest,
+                                            self.factor)))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentiles(self):
+        """ Returns min, max, mean and estimated percentiles of values """
+        if not self.count:
+            return {}
+        result = {'min': self.min, 'max': self.max,
+                  'mean': self.total / self.count}
+        ranks = [('p50', 0.5), ('p90', 0.9), ('p99', 0.99)]
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            while ranks and seen > ranks[0][1] * self.count:
+                # Upper bound of bucket, within range of recorded values
+                bound = self.smallest * self.factor ** bucket
+                result[ranks.pop(0)[0]] = min(max(bound, self.min), self.max)
+        return result
+
+class Stats(object):
+    """ Collects request and task metrics in histograms. Hooks are called
+    with the metric kind, the endpoint or task id and a dict of values """
+
+    max_pending = 10000  # Tasks whose polls are counted until completion
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hooks = []
+        self._stop = None
+        self.reset()
+
+    def reset(self):
+        """ Clears all collected metrics """
+        with self.lock:
+            self.endpoints = {}
+            self.tasks = dict((key, Histogram()) for key in
+                              ('duration', 'waited', 'polling', 'sleeping'))
+            self.task_count = 0
+            self.task_polls = 0
+            self.polls = OrderedDict()  # Task id mapped to polls until done
+            self.notifications = Histogram()
+
+    def _emit(self, kind, name, values):
+        for hook in self.hooks:
+            try:
+                hook(kind, name, values)
+            except Exception:
+                logging.exception('Stats hook failed')
+
+    def _endpoint(self, endpoint):
+        return self.endpoints.setdefault(endpoint, {
+            'latency': Histogram(), 'decode': 0.0, 'bytes_in': 0,
+            'bytes_out': 0, 'status': {}})
+
+    def record_request(self, endpoint, seconds, status, bytes_out, bytes_in):
+        with self.lock:
+            stats = self._endpoint(endpoint)
+            stats['latency'].add(seconds)
+            stats['bytes_out'] += bytes_out
+            stats['bytes_in'] += bytes_in
+            stats['status'][status] = stats['status'].get(status, 0) + 1
+        self._emit('request', endpoint, {'seconds': seconds, 'status': status,
+                                         'bytes_out': bytes_out,
+                                         'bytes_in': bytes_in})
+
+    def record_decode(self, endpoint, seconds):
+        with self.lock:
+            self._endpoint(endpoint)['decode'] += seconds
+        self._emit('decode', endpoint, {'seconds': seconds})
+
+    def record_poll(self, task_id, seconds):
+        with self.lock:
+            polls = self.polls.setdefault(task_id, [0, 0.0, 0.0])
+            polls[0] += 1
+            polls[1] += seconds
+            # Forget tasks that timed out or were never waited on again
+            while len(self.polls) > self.max_pending:
+                self.polls.popitem(last=False)
+
+    def record_sleep(self, task_id, seconds):
+        with self.lock:
+            if task_id in self.polls:
+                self.polls[task_id][2] += seconds
+
+    def record_notification(self, task_id, latency):
+        """ Records seconds between task completion and its notification """
+        with self.lock:
+            if latency is not None:
+                self.notifications.add(latency)
+        self._emit('notification', task_id, {'latency': latency})
+
+    def record_task(self, task_id, duration, waited):
+        """ Records time to completion reported by the controller, time
+        waited by the client and time spent polling and sleeping """
+        with self.lock:
+            polls, polling, sleeping = self.polls.pop(task_id, [0, 0.0, 0.0])
+            values = {'duration': duration, 'waited': waited, 'polls': polls,
+                      'polling': polling, 'sleeping': sleeping}
+            self.task_count += 1
+            self.task_polls += polls
+            for key, histogram in self.tasks.items():
+                histogram.add(values[key])
+        self._emit('task', task_id, values)
+
+    def summary(self):
+        """ Returns collected metrics with latency percentiles """
+        with self.lock:
+            endpoints = dict((endpoint, {
+                'count': stats['latency'].count,
+                'latency': stats['latency'].percentiles(),
+                'decode': stats['decode'],
+                'bytes_in': stats['bytes_in'],
+                'bytes_out': stats['bytes_out'],
+                'status': dict((str(k), v)
+                               for k, v in stats['status'].items())})
+                for endpoint, stats in self.endpoints.items())
+            tasks = dict((key, histogram.percentiles())
+                         for key, histogram in self.tasks.items())
+            tasks['count'] = self.task_count
+            tasks['polls'] = self.task_polls
+            tasks['notification'] = self.notifications.percentiles()
+        return JsonObj(endpoints=endpoints, tasks=tasks)
+
+    def dump(self, filename):
+        """ Writes summary to JSON file """
+        with open(filename, 'w') as f:
+            json.dump(self.summary(), f, indent=4)
+
+    def start_logging(self, interval=60, filename=None):
+        """ Logs summary and optionally dumps it to file periodically """
+        self.stop_logging()
+        stop = self._stop = threading.Event()
+        def run():
+            while not stop.wait(interval):
+                logging.info('STATS ' + json.dumps(self.summary()))
+                if filename:
+                    self.dump(filename)
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    def stop_logging(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+
+class ResponseCache(object):
+    """ On-disk cache of JSON encoded GET responses with a time-to-live per
+    API path prefix and least recently used eviction """
+
+    # Responses of these API path prefixes are never cached by default
+    ttls = {'api/v1/task': 0, 'api/system/v1/auth': 0}
+
+    def __init__(self, path, ttl=300, ttls=None, max_entries=1000):
+        self.path = path
+        self.ttl = ttl
+        self.ttls = dict(self.ttls, **(ttls or {}))
+        self.max_entries = max_entries
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def ttl_of(self, ver, api):
+        """ Returns TTL in seconds of the longest matching API path prefix """
+        path = ver.strip('/') + '/' + api.strip('/')
+        matches = [p for p in self.ttls if path.startswith(p.strip('/'))]
+        return self.ttls[max(matches, key=len)] if matches else self.ttl
+
+    def key(self, url, params=None, family=''):
+        """ Returns cache key of URL and query parameters, prefixed by hash
+        of resource family so that a family is invalidated by file name """
+        text = url + '?' + json.dumps(params, sort_keys=True)
+        return self._prefix(family) + _sha1(text)
+
+    def _prefix(self, family):
+        return _sha1(family)[:16] + '-'
+
+    def load(self, key):
+        """ Returns cache entry or None if not cached """
+        try:
+            with open(os.path.join(self.path, key + '.json')) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def store(self, key, entry):
+        """ Writes cache entry and evicts least recently used entries """
+        import tempfile
+        # Unique temporary file, as threads may store the same key at once
+        fd, tmpname = tempfile.mkstemp(suffix='.tmp', dir=self.path)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        try:
+            os.replace(tmpname, os.path.join(self.path, key + '.json'))
+        except OSError:
+            self._remove(tmpname)  # Cache directory was cleared meanwhile
+        self._evict()
+
+    def touch(self, key):
+        """ Marks cache entry as recently used """
+        try:
+            os.utime(os.path.join(self.path, key + '.json'), None)
+        except OSError:
+            pass
+
+    def invalidate(self, family=None):
+        """ Removes entries of a resource family or all entries """
+        prefix = self._prefix(family) if family is not None else ''
+        for filename in self._files():
+            if not filename.startswith(prefix):
+                continue
+            logging.debug('Cache invalidated for ' + filename)
+            self._remove(filename)
+
+    def _files(self):
+        return [f for f in os.listdir(self.path) if f.endswith('.json')]
+
+    def _remove(self, filename):
+        try:
+            os.remove(os.path.join(self.path, filename))
+        except OSError:
+            pass  # Removed by another thread
+
+    def _evict(self):
+        files = self._files()
+        if len(files) > self.max_entries:
+            def mtime(filename):
+                try:
+                    return os.path.getmtime(os.path.join(self.path, filename))
+                except OSError:
+                    return 0
+            files.sort(key=mtime)
+            for filename in files[:len(files) - self.max_entries]:
+                self._remove(filename)
+
+class Index(object):
+    """ List of JSON objects with hash tables for lookups by any key. A table
+    is built in a single pass on the first lookup by that key """
+
+    def __init__(self, objs=(), paths=None):
+        self.objs = list(objs)
+        self.paths = list(paths) if paths is not None else None
+        self._tables = {}
+        self._groups = {}
+
+    @classmethod
+    def walk(cls, obj):
+        """ Returns Index of all JSON objects nested in obj, with the path of
+        each object in attribute paths """
+        walked = list(walk(obj))
+        return cls([o for _, o in walked], [path for path, _ in walked])
+
+    def __iter__(self):
+        return iter(self.objs)
+
+    def __len__(self):
+        return len(self.objs)
+
+    def __getitem__(self, idx):
+        return self.objs[idx]
+
+    def append(self, obj, path=None):
+        """ Appends object to list and updates existing tables """
+        if self.paths is not None:
+            self.paths.append(path)
+        self.objs.append(obj)
+        for key, table in self._tables.items():
+            if _hashable(obj.get(key)):
+                table.setdefault(obj[key], obj)
+        for key, group in self._groups.items():
+            if _hashable(obj.get(key)):
+                group.setdefault(obj[key], []).append(len(self.objs) - 1)
+
+    def table(self, key):
+        """ Returns dict of key values mapped to the first object found """
+        if key not in self._tables:
+            table = {}
+            for obj in self.objs:
+                if _hashable(obj.get(key)):
+                    table.setdefault(obj[key], obj)
+            self._tables[key] = table
+        return self._tables[key]
+
+    def group(self, key):
+        """ Returns dict of key values mapped to positions of all objects """
+        if key not in self._groups:
+            group = {}
+            for i, obj in enumerate(self.objs):
+                if _hashable(obj.get(key)):
+                    group.setdefault(obj[key], []).append(i)
+            self._groups[key] = group
+        return self._groups[key]
+
+    def find_all(self, key, val, paths=False):
+        """ Returns list of all objects having the value of a key, or of path
+        and object tuples if paths is true """
+        positions = self.group(key).get(val, []) if _hashable(val) else []
+        if paths:
+            return [(self.paths[i], self.objs[i]) for i in positions]
+        return [self.objs[i] for i in positions]
+
+    def get(self, key, val, default=None):
+        """ Returns object having the value of a key or default """
+        return self.table(key).get(val, default)
+
+    def lookup(self, key, val):
+        """ Find object by value of key, raises ValueError if not found """
+        if val == "":
+            return None
+        r = self.get(key, val)
+        if r is None:
+            raise(ValueError(val + " not found"))
+        return r
+
+class _StreamDecoder(object):
+    """ Incremental decoder of JSON text read in chunks """
+
+    def __init__(self, chunks, **kwargs):
+        self.chunks = iter(chunks)
+        self.decoder = json.JSONDecoder(**kwargs)
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """ Appends next chunk to buffer, returns False at end of input """
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """ Returns next non-whitespace character or '' at end of input """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\n\r':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, chars):
+        """ Consumes and returns next character, which must be one of chars """
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError('Expecting %s: %r' % (' or '.join(chars),
+                                                   self.buf[self.pos:][:20]))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """ Decodes next JSON value, reading more chunks as needed """
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if not self._fill():
+                    raise
+                continue
+            # A number or literal at the end of the buffer may be truncated,
+            # including a number followed by only part of its fraction or
+            # exponent, such as -0 followed by a period
+            rest = self.buf[end:]
+            truncated = end == len(self.buf) or (
+                isinstance(obj, (int, float)) and not isinstance(obj, bool)
+                and not rest.strip('0123456789.eE+-'))
+            if truncated and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+def _iter_response(chunks, key='response'):
+    """ Helper generator yielding elements of the array of a top-level key of
+    a JSON object read in chunks """
+    stream = _StreamDecoder(chunks, object_hook=JsonObj)
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+    while True:
+        name = stream.value()
+        stream.expect(':')
+        if name == key and stream.peek() == '[':
+            stream.expect('[')
+            if stream.peek() == ']':
+                stream.expect(']')
+            else:
+                while True:
+                    yield stream.value()
+                    if stream.expect(',]') == ']':
+                        break
+        elif name == key:
+            yield stream.value()  # Response is not an array
+        else:
+            stream.value()  # Skip value of other key
+        if stream.expect(',}') == '}':
+            return
+
 def _flatten(string, dct, keys):
     """ Helper function to join values of given keys existing in dict """
     return string.join(str(dct[k]) for k in set(keys) & set(dct.keys()))
 
+def _backoff(attempt, base=0.5, cap=30):
+    """ Helper function returning exponential backoff delay with jitter """
+    import random
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def _retry_after(response):
+    """ Helper function returning seconds of Retry-After header or None """
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    from email.utils import parsedate_tz, mktime_tz
+    date = parsedate_tz(value)
+    return max(0, mktime_tz(date) - time.time()) if date else None
+
+def _sha1(text):
+    """ Helper function returning hex digest of SHA-1 hash of a string """
+    import hashlib
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def _split(path):
+    """ Helper function splitting URL path into version and API path """
+    match = re.match(r'/?((?:api/)?(?:system/)?v\d+)/(.*)', path)
+    return match.groups() if match else ('', path)
+
+def _family(ver, api):
+    """ Helper function returning resource family of API path """
+    parts = api.strip('/').split('/')
+    # Data API paths are qualified by service and object type
+    return '/'.join([ver.strip('/')] + parts[:3 if parts[0] == 'data' else 1])
+
+def _hashable(val):
+    """ Helper function returning true if value can be a dict key """
+    return val is not None and not isinstance(val, (dict, list))
+
+def walk(obj):
+    """ Yields path and object of all JSON objects nested in obj in document
+    order. The path is a tuple of keys and list indexes """
+    stack = [((), obj)]
+    while stack:  # Iterative to avoid recursion limits on deep nesting
+        path, obj = stack.pop()
+        if isinstance(obj, dict):
+            yield path, obj
+            items = list(obj.items())
+        elif isinstance(obj, list):
+            items = list(enumerate(obj))
+        else:
+            continue
+        for key, item in reversed(items):
+            if isinstance(item, (dict, list)):
+                stack.append((path + (key,), item))
+
+def find_all(obj, val, key='id', paths=False):
+    """ Search JSON object for all nested objects having a value of a
+    key/attribute, returns path and object tuples if paths is true """
+    return [(path, o) if paths else o for path, o in walk(obj)
+            if o.get(key) == val]
+
 def find(obj, val, key='id'):
-    """ Recursively search JSON object for a value of a key/attribute """
-    if isinstance(obj, list):  # JSON array
-        for item in obj:
-            r = find(item, val, key)
-            if r is not None:
-                return r
-    elif isinstance(obj, JsonObj):  # JSON object
-        if obj.get(key) == val:
-            return obj
-        for item in iter(obj):
-            if isinstance(obj[item], list):
-                return find(obj[item], val, key)
+    """ Search JSON object for the first nested object having a value of a
+    key/attribute, returns None if not found """
+    return next((o for _, o in walk(obj) if o.get(key) == val), None)
 
 def ctime(val):
     """ Convert time in milliseconds since the epoch to a formatted string """
@@ -0,0 +1,130 @@
+"""
+Command line interface running the sample scripts against DNA Center
+
+Usage:
+
+  python dnac.py --host 10.0.0.1 --username admin segment
+  python dnac.py pool-import pool-import.csv --workers 4
+  python dnac.py cfs-import cfs-import.csv --dry-run
+  python dnac.py template --template Banner --targets devices.csv
+  python dnac.py snapshot dnac.db
+  python dnac.py segment --snapshot dnac.db
+
+The host, username, password and cache directory default to environment
+variables DNAC_HOST, DNAC_USERNAME, DNAC_PASSWORD and DNAC_CACHE. The password
+is prompted for if not given. With --webhook, or DNAC_WEBHOOK, tasks are
+waited on by receiving their completion notifications on the port of that
+URL. Commands given a --snapshot file run offline and do not connect to DNA
+Center. Script modules and the requests library are
+only imported once a command runs.
+"""
+
+# Author: Tim Dorssers
+
+import os
+import sys
+import logging
+import argparse
+import importlib
+
+# Commands and descriptions, the script module is named after the command
+COMMANDS = [("segment", "display SDA segments"),
+            ("pool-import", "add global IP pools and reserve sub pools from "
+                            "a csv file"),
+            ("cfs-import", "configure Campus fabric edge ports from a csv "
+                           "file"),
+            ("template", "provision a user template without using network "
+                         "profiles"),
+            ("snapshot", "store DNA Center objects in a local snapshot "
+                         "file")]
+
+def make_parser(command=None):
+    """ Returns parser of global options and a sub parser per command. The
+    arguments of a single command are added to the parser itself """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1],
+                                     add_help=False)
+    env = os.environ.get
+    parser.add_argument("--host", default=env("DNAC_HOST"),
+                        help="DNA Center address or URL")
+    parser.add_argument("-u", "--username", default=env("DNAC_USERNAME"))
+    parser.add_argument("-p", "--password", default=env("DNAC_PASSWORD"))
+    parser.add_argument("--scheme", choices=("https", "http"),
+                        default="https", help="http connects without TLS, "
+                                              "for instance to dnasim.py")
+    parser.add_argument("--cache", default=env("DNAC_CACHE", ""),
+                        help="response cache directory")
+    parser.add_argument("-d", "--debug", action="store_true",
+                        help="enable debug logging")
+    parser.add_argument("--webhook", default=env("DNAC_WEBHOOK"),
+                        help="URL of this host at which task notifications "
+                             "are received, instead of polling tasks")
+    parser.add_argument("--webhook-events", type=lambda s: s.split(","),
+                        metavar="EVENTS",
+                        help="comma separated event ids of task completion, "
+                             "TASK_COMPLETE,TASK_FAILURE if not specified")
+    if command:
+        parser.description = dict(COMMANDS)[command]
+        parser.set_defaults(command=command)
+        return parser, {command: parser}
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+    commands = {}
+    for name, description in COMMANDS:
+        commands[name] = subparsers.add_parser(name, help=description,
+                                               description=description,
+                                               add_help=False)
+    return parser, commands
+
+def main(argv=None, command=None):
+    """ Runs command, or the given command with its own arguments only """
+    parser, commands = make_parser(command)
+    args, _ = parser.parse_known_args(argv)
+    if args.command is None:
+        if set(sys.argv[1:] if argv is None else argv) & {"-h", "--help"}:
+            parser.print_help()
+            return
+        parser.error("the following arguments are required: command")
+    # Help is added once the arguments of the script are known
+    script = importlib.import_module(args.command)
+    for subparser in set([parser, commands[args.command]]):
+        subparser.add_argument("-h", "--help", action="help",
+                               help="show this help message and exit")
+    script.add_arguments(commands[args.command])
+    args = parser.parse_args(argv)
+    # Combinations of arguments are checked by the script if it can
+    if hasattr(script, "check_arguments"):
+        script.check_arguments(commands[args.command], args)
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG,
+                            format='%(asctime)s - %(levelname)s - %(message)s')
+    if getattr(args, "snapshot", None):  # Run offline
+        script.run(None, args)
+        return
+    if not args.host:
+        parser.error("the following arguments are required: --host")
+    if args.webhook:
+        from urllib.parse import urlsplit
+        # Notifications are received on the port of the URL
+        port = urlsplit(args.webhook).port
+        if port is None:
+            parser.error("--webhook URL requires a port")
+    if args.password is None:
+        import getpass
+        args.password = getpass.getpass()
+    import dna
+    with dna.Dnac(args.host, cache=args.cache, scheme=args.scheme) as dnac:
+        dnac.login(args.username, args.password)
+        receiver = None
+        try:
+            if args.webhook:
+                import events
+                receiver = events.EventReceiver(port=port, url=args.webhook)
+                receiver.start()
+                receiver.subscribe(dnac, event_ids=args.webhook_events)
+                dnac.events = receiver
+            script.run(dnac, args)
+        finally:
+            if receiver is not None:
+                receiver.stop()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
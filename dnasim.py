@@ -0,0 +1,488 @@
+"""
+This module implements a simulated DNA Center northbound API for offline
+testing and benchmarking of the dna module and the sample scripts
+
+Basic Usage:
+
+  python dnasim.py --port 8080 --devices 1000 --latency 0.01 --task-delay 1
+
+  with dna.Dnac('127.0.0.1:8080', scheme='http') as dnac:
+      dnac.login('admin', 'password')
+      print(dnac.get('network-device/count'))
+
+Or embedded:
+
+  with dnasim.Simulator(devices=1000) as sim:
+      with dna.Dnac(sim.url, scheme='http') as dnac:
+          dnac.login('admin', 'password')
+
+Recorded responses are replayed by passing a directory of JSON files, named
+after the API path with slashes replaced by underscores, for instance
+network-device.json or data_customer-facing-service_Segment.json.
+
+Requires Python 3.
+"""
+
+# Author: Tim Dorssers
+
+import os
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qsl
+from urllib.request import Request, urlopen
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+def make_device(i):
+    """ Returns synthetic network device resembling a DNA Center response """
+    return {"id": "%08x-0000-0000-0000-%012x" % (i, i),
+            "hostname": "switch-%d.example.com" % i,
+            "managementIpAddress": "10.%d.%d.%d" % (i >> 16 & 255,
+                                                    i >> 8 & 255, i & 255),
+            "family": "Switches and Hubs",
+            "platformId": "C9300-48U",
+            "softwareVersion": "16.9.3",
+            "serialNumber": "FOC%08d" % i,
+            "role": "ACCESS",
+            "upTime": "12 days, 3:45:12.34",
+            "reachabilityStatus": "Reachable",
+            "lastUpdateTime": 1546300800000 + i,
+            "interfaceCount": "52",
+            "tagCount": "0",
+            "series": "Cisco Catalyst 9300 Series Switches",
+            "macAddress": "00:11:22:%02x:%02x:%02x" % (i >> 16 & 255,
+                                                       i >> 8 & 255, i & 255),
+            "lineCardCount": "2",
+            "lineCardId": "",
+            "location": None,
+            "errorCode": None,
+            "collectionStatus": "Managed",
+            "instanceTenantId": "5c1b2e2e4b9f7b00086c6a42"}
+
+def make_interfaces(device, ports):
+    """ Returns synthetic interfaces of a network device """
+    return [{"id": "%s-%04d" % (device["id"][:23], port),
+             "deviceId": device["id"],
+             "portName": "GigabitEthernet1/0/%d" % port,
+             "interfaceType": "Physical",
+             "portMode": "access",
+             "status": "up",
+             "speed": "1000000"} for port in range(1, ports + 1)]
+
+class NotFound(Exception):
+    """ Raised by handlers when the requested object does not exist """
+    pass
+
+class Controller(object):
+    """ In-memory state of the simulated controller """
+
+    def __init__(self, devices=10, ports=48, sites=10, task_delay=0,
+                 records=None, notify_loss=0, page_limit=500):
+        self.devices = [make_device(i) for i in range(devices)]
+        self.device_ids = dict((d["id"], d) for d in self.devices)
+        self.hostnames = dict((d["hostname"], d) for d in self.devices)
+        self.ports = ports
+        self.task_delay = task_delay
+        self.records = records
+        self.notify_loss = notify_loss  # Fraction of notifications dropped
+        self.page_limit = page_limit  # Maximum number of items per page
+        self.subscriptions = []
+        self.lock = threading.Lock()
+        self.tasks = {}
+        self.device_info = {}
+        self.ippools = []
+        self.sites = [{"id": str(uuid.uuid4()),
+                       "groupTypeList": ["SITE"],
+                       "groupNameHierarchy": "Global/Site-%d" % i,
+                       "name": "Site-%d" % i} for i in range(sites)]
+        domain = str(uuid.uuid4())
+        self.domains = [{"id": domain, "name": "Default_Fabric",
+                         "domainType": "FABRIC_LAN"}]
+        self.segments = [{"id": str(uuid.uuid4()), "name": name,
+                          "vlanId": vlan, "trafficType": traffic,
+                          "isFloodAndLearn": False,
+                          "connectivityDomain": {"idRef": domain}}
+                         for name, vlan, traffic in
+                         (("10_25_4_0-DEFAULT_VN", 1021, "DATA"),
+                          ("10_25_5_0-DEFAULT_VN", 1022, "DATA"),
+                          ("10_25_6_0-DEFAULT_VN", 1023, "VOICE"))]
+        self.sgts = [{"id": str(uuid.uuid4()), "name": name}
+                     for name in ("Employees", "Guests", "Contractors")]
+        self.siteprofiles = [{"siteProfileUuid": str(uuid.uuid4()),
+                              "name": name} for name in
+                             ("No Authentication", "Open Authentication",
+                              "Closed Authentication")]
+        version = str(uuid.uuid4())
+        self.templates = [{"id": str(uuid.uuid4()), "name": "Banner",
+                           "projectName": "Onboarding Configuration",
+                           "versionsInfo": [{"id": version, "version": "1"}]}]
+        self.template_versions = {version: {
+            "id": version, "name": "Banner",
+            "templateContent": "banner motd ^$message^",
+            "templateParams": [{"parameterName": "message",
+                                "dataType": "STRING",
+                                "displayName": "Message",
+                                "selection": None, "range": []}],
+            "deviceTypes": [{"productFamily": "Switches and Hubs"}]}}
+
+    def add_task(self, progress="", error=None):
+        """ Registers task completing after the configured delay """
+        task_id = str(uuid.uuid4())
+        with self.lock:
+            self.tasks[task_id] = {"id": task_id,
+                                   "startTime": int(time.time() * 1000),
+                                   "progress": progress,
+                                   "isError": error is not None,
+                                   "failureReason": error}
+            if self.subscriptions:
+                timer = threading.Timer(self.task_delay, self.notify,
+                                        [task_id])
+                timer.daemon = True
+                timer.start()
+        return {"taskId": task_id, "url": "/api/v1/task/" + task_id}
+
+    def subscribe(self, data):
+        """ Registers event subscriptions posting to webhook URLs """
+        with self.lock:
+            for subscription in data:
+                self.subscriptions.append(dict(subscription,
+                                               subscriptionId=str(
+                                                   uuid.uuid4())))
+        return {"statusUri": "/dna/intent/api/v1/event/api-status/"
+                + str(uuid.uuid4())}
+
+    def unsubscribe(self, query):
+        """ Removes event subscriptions by comma separated ids """
+        ids = set(query.get("subscriptions", "").split(","))
+        with self.lock:
+            self.subscriptions = [s for s in self.subscriptions
+                                  if s["subscriptionId"] not in ids]
+        return {"statusUri": "/dna/intent/api/v1/event/api-status/"
+                + str(uuid.uuid4())}
+
+    def webhooks(self, event_id):
+        """ Returns URLs of subscriptions to the event """
+        return [endpoint["subscriptionDetails"]["url"]
+                for s in self.subscriptions
+                if event_id in s.get("filter", {}).get("eventIds", [])
+                for endpoint in s["subscriptionEndpoints"]]
+
+    def notify(self, task_id):
+        """ Posts completion event of task to all webhooks """
+        if random.random() < self.notify_loss:
+            return
+        task = self.tasks[task_id]
+        event = {"eventId": "TASK_FAILURE" if task["isError"]
+                            else "TASK_COMPLETE",
+                 "instanceId": str(uuid.uuid4()),
+                 "timestamp": task["startTime"] + int(self.task_delay * 1000),
+                 "details": {"taskId": task_id, "isError": task["isError"],
+                             "progress": task["progress"]}}
+        body = json.dumps(event).encode('utf-8')
+        for url in self.webhooks(event["eventId"]):
+            try:
+                urlopen(Request(url, body, {"Content-Type":
+                                            "application/json"}),
+                        timeout=5).close()
+            except (OSError, ValueError):
+                pass  # Receiver is gone
+
+    def get_task(self, task_id):
+        """ Returns task status, which has an end time once completed """
+        task = dict(self._get(self.tasks, task_id))
+        end_time = task["startTime"] + int(self.task_delay * 1000)
+        if time.time() * 1000 >= end_time:
+            task["endTime"] = end_time
+        else:
+            task["progress"] = "In progress"
+            task.pop("failureReason")
+        return task
+
+    def get_device_info(self, name):
+        """ Returns DeviceInfo of device with name or id, creates if new """
+        device = self.device_ids.get(name) or self.hostnames.get(name)
+        if device is None:
+            return []
+        with self.lock:
+            info = self.device_info.setdefault(device["id"], {
+                "id": str(uuid.uuid4()), "name": device["hostname"],
+                "networkDeviceId": device["id"], "deviceInterfaceInfo": []})
+        return [info]
+
+    def device_infos(self, query):
+        """ Returns DeviceInfo by name or a page of DeviceInfo of all
+        devices """
+        if "name" in query:
+            return self.get_device_info(query["name"])
+        offset = int(query.get("offset", 1))
+        limit = min(int(query.get("limit", 500)), self.page_limit)
+        return [self.get_device_info(d["id"])[0]
+                for d in self.devices[offset - 1:offset - 1 + limit]]
+
+    def put_device_info(self, data):
+        with self.lock:
+            for info in data:
+                # Referenced objects are populated like DNA Center does
+                for dii in info.get("deviceInterfaceInfo", []):
+                    if "authenticationProfileId" in dii:
+                        dii["authenticationProfile"] = {
+                            "idRef": dii["authenticationProfileId"]}
+                self.device_info[info["networkDeviceId"]] = info
+        return self.add_task()
+
+    def add_ippool(self, data, parent=None):
+        """ Adds IP pool and returns task having the new id as progress """
+        if parent is not None:
+            self._get(dict((p["id"], p) for p in self.ippools), parent)
+        pool = dict(data, id=str(uuid.uuid4()))
+        with self.lock:
+            overlap = next((p for p in self.ippools
+                            if p["ipPoolCidr"] == pool["ipPoolCidr"]
+                            and p.get("parentUuid") == parent), None)
+            if overlap is None:
+                self.ippools.append(pool)
+        if overlap is not None:
+            return self.add_task(error="Overlapping IP pool %s"
+                                 % overlap["ipPoolName"])
+        return self.add_task(pool["id"])
+
+    def network_devices(self, query):
+        offset = int(query.get("offset", 1))
+        limit = min(int(query.get("limit", 500)), self.page_limit)
+        if "hostname" in query:
+            device = self.hostnames.get(query["hostname"])
+            return [device] if device else []
+        return self.devices[offset - 1:offset - 1 + limit]
+
+    def interfaces(self, device_id):
+        return make_interfaces(self._get(self.device_ids, device_id),
+                               self.ports)
+
+    def template(self, version_id):
+        return self._get(self.template_versions, version_id)
+
+    def record(self, path):
+        """ Returns recorded response of API path or None """
+        if self.records is None:
+            return None
+        filename = os.path.join(self.records,
+                                path.strip('/').replace('/', '_') + '.json')
+        if not os.path.isfile(filename):
+            return None
+        with open(filename) as f:
+            return json.load(f)
+
+    def route(self, method, path, query, data):
+        """ Returns response of API call or raises NotFound """
+        for pattern, handlers in self.routes:
+            match = re.match(pattern + "$", path)
+            if match and method in handlers:
+                return handlers[method](self, query, data, *match.groups())
+        raise NotFound("%s %s" % (method, path))
+
+    def _get(self, dct, key):
+        try:
+            return dct[key]
+        except KeyError:
+            raise NotFound(key)
+
+    # Template programmer and event subscriptions return objects without
+    # response wrapper
+    unwrapped = (r"(template-programmer/template(/(?!deploy$)[^/]+)?"
+                 r"|event/subscription)$")
+
+    # API paths, stripped of version prefix, and handlers per method
+    routes = [
+        (r"network-device", {"GET": lambda self, q, d:
+                             self.network_devices(q)}),
+        (r"network-device/count", {"GET": lambda self, q, d:
+                                   len(self.devices)}),
+        (r"network-device/([^/]+)", {"GET": lambda self, q, d, i:
+                                     self._get(self.device_ids, i)}),
+        (r"interface/network-device/([^/]+)", {"GET": lambda self, q, d, i:
+                                               self.interfaces(i)}),
+        (r"task/([^/]+)", {"GET": lambda self, q, d, i: self.get_task(i)}),
+        (r"siteprofile", {"GET": lambda self, q, d: self.siteprofiles}),
+        (r"group", {"GET": lambda self, q, d: self.sites}),
+        (r"commonsetting/global/([^/]+)", {"POST": lambda self, q, d, i:
+                                           self.add_task()}),
+        (r"ippool", {"GET": lambda self, q, d: self.ippools,
+                     "POST": lambda self, q, d: self.add_ippool(d)}),
+        (r"ippool/subpool", {"POST": lambda self, q, d:
+                             self.add_ippool(d, d.get("parentUuid"))}),
+        (r"data/customer-facing-service/DeviceInfo", {
+            "GET": lambda self, q, d: self.device_infos(q),
+            "PUT": lambda self, q, d: self.put_device_info(d)}),
+        (r"data/customer-facing-service/Segment", {"GET": lambda self, q, d:
+                                                   self.segments}),
+        (r"data/customer-facing-service/ConnectivityDomain", {
+            "GET": lambda self, q, d: self.domains}),
+        (r"data/customer-facing-service/scalablegroup", {
+            "GET": lambda self, q, d: self.sgts}),
+        (r"template-programmer/template", {"GET": lambda self, q, d:
+                                           self.templates}),
+        (r"template-programmer/template/deploy", {"POST": lambda self, q, d:
+                                                  self.add_task("Deployed")}),
+        (r"template-programmer/template/([^/]+)", {"GET": lambda self, q, d, i:
+                                                  self.template(i)}),
+        (r"event/subscription", {"GET": lambda self, q, d:
+                                 self.subscriptions,
+                                 "POST": lambda self, q, d:
+                                 self.subscribe(d),
+                                 "DELETE": lambda self, q, d:
+                                 self.unsubscribe(q)}),
+    ]
+
+class Handler(BaseHTTPRequestHandler):
+    """ Handles requests to the simulated API """
+
+    protocol_version = 'HTTP/1.1'  # Keep connections alive
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, obj, headers=None):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_api(self, method):
+        server = self.server
+        time.sleep(server.latency)
+        url = urlsplit(self.path)
+        query = dict(parse_qsl(url.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        data = json.loads(self.rfile.read(length).decode('utf-8') or 'null')
+        if server.throttle():
+            return self.send_json(429, {"response": {
+                "errorCode": "TOO_MANY_REQUESTS",
+                "message": "Rate limit exceeded"}}, {'Retry-After': '1'})
+        # Strip version prefix such as api/v1, api/v2, api/system/v1, v2 or
+        # dna/intent/api/v1
+        path = re.sub(r'^/(dna/intent/)?(api/)?(system/)?v\d+/', '', url.path)
+        if path == 'auth/token' and method == 'POST':
+            return self.send_json(200, {"Token": server.token})
+        if self.headers.get('X-Auth-Token') != server.token:
+            return self.send_json(401, {"response": {
+                "errorCode": "Unauthorized",
+                "message": "Authentication has failed"}})
+        recorded = server.controller.record(path) if method == 'GET' else None
+        if recorded is not None:
+            return self.send_json(200, recorded)
+        try:
+            response = server.controller.route(method, path, query, data)
+        except NotFound as e:
+            return self.send_json(404, {"response": {
+                "errorCode": "NOT_FOUND", "message": "Not found",
+                "detail": str(e)}})
+        if method == 'GET' and re.match(server.controller.unwrapped, path):
+            return self.send_json(200, response)
+        status = 202 if method in ('POST', 'PUT', 'DELETE') else 200
+        self.send_json(status, {"response": response, "version": "1.0"})
+
+    def do_GET(self):
+        self.handle_api('GET')
+
+    def do_POST(self):
+        self.handle_api('POST')
+
+    def do_PUT(self):
+        self.handle_api('PUT')
+
+    def do_DELETE(self):
+        self.handle_api('DELETE')
+
+class Simulator(ThreadingMixIn, HTTPServer):
+    """ Threaded HTTP server simulating a DNA Center controller """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0, rate_limit=0,
+                 **kwargs):
+        HTTPServer.__init__(self, (host, port), Handler)
+        self.controller = Controller(**kwargs)
+        self.latency = latency
+        self.rate_limit = rate_limit  # Requests per second, 0 is unlimited
+        self.token = str(uuid.uuid4())
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self._window = (0, 0)  # Second and number of requests within it
+        self.url = 'http://%s:%d' % self.server_address[:2]
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def throttle(self):
+        """ Counts request and returns True if rate limit is exceeded """
+        second = int(time.time())
+        with self.lock:
+            self.requests += 1
+            count = self._window[1] + 1 if self._window[0] == second else 1
+            self._window = (second, count)
+            if self.rate_limit and count > self.rate_limit:
+                self.throttled += 1
+                return True
+        return False
+
+    def start(self):
+        """ Serves requests in a background thread """
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--devices', type=int, default=10,
+                        help='number of network devices')
+    parser.add_argument('--ports', type=int, default=48,
+                        help='number of interfaces per device')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds added to each request')
+    parser.add_argument('--task-delay', type=float, default=0,
+                        help='seconds before a task completes')
+    parser.add_argument('--rate-limit', type=int, default=0,
+                        help='requests per second before HTTP 429 is returned')
+    parser.add_argument('--records', help='directory of recorded responses')
+    parser.add_argument('--notify-loss', type=float, default=0,
+                        help='fraction of task notifications dropped')
+    parser.add_argument('--page-limit', type=int, default=500,
+                        help='maximum number of items per page')
+    args = parser.parse_args()
+    sim = Simulator(args.host, args.port, args.latency, args.rate_limit,
+                    devices=args.devices, ports=args.ports,
+                    task_delay=args.task_delay, records=args.records,
+                    notify_loss=args.notify_loss,
+                    page_limit=args.page_limit)
+    print("Serving simulated DNA Center at %s" % sim.url)
+    try:
+        sim.serve_forever()
+    except KeyboardInterrupt:
+        sim.server_close()
+
+if __name__ == "__main__":
+    main()
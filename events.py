@@ -0,0 +1,161 @@
+"""
+This module implements a webhook receiver of DNA Center event notifications,
+so that tasks are known to be completed without polling their status
+
+Basic Usage:
+
+  with events.EventReceiver(port=9000, url='http://10.0.0.5:9000/') as rcv:
+      with dna.Dnac('https://10.0.0.1/', events=rcv) as dnac:
+          dnac.login('admin', 'password')
+          rcv.subscribe(dnac)
+          dnac.wait_on_task(task_id)
+
+The URL is the address of the receiver as seen by DNA Center. An existing
+subscription of the same name, URL and events is reused, so that repeated
+runs do not add subscriptions. Task status is requested once a notification
+of its completion arrives. Tasks are polled
+only when no notification arrives in time, at longer intervals while
+notifications are being received.
+"""
+
+# Author: Tim Dorssers
+
+import json
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from dna import walk
+
+# Event ids of task completion notifications, these depend on the release
+TASK_EVENTS = ['TASK_COMPLETE', 'TASK_FAILURE']
+
+class _Handler(BaseHTTPRequestHandler):
+    """ Passes JSON encoded notifications to the receiver """
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        try:
+            event = json.loads(body.decode('utf-8'))
+        except ValueError:
+            logging.debug('Notification is not JSON encoded')
+            return
+        for item in event if isinstance(event, list) else [event]:
+            self.server.receiver.notify(item)
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class EventReceiver(object):
+    """ Receives event notifications and wakes threads waiting on tasks """
+
+    def __init__(self, host='0.0.0.0', port=0, url=None, factor=5,
+                 window=300, retention=600):
+        self.server = _Server((host, port), _Handler)
+        self.server.receiver = self
+        self.url = url or 'http://%s:%d/' % self.server.server_address[:2]
+        self.factor = factor  # Poll interval multiplier while notified
+        self.window = window  # Seconds a notification counts as recent
+        self.retention = retention  # Seconds unclaimed notifications last
+        self.count = 0
+        self.last = None  # Time last notification was received
+        self._cond = threading.Condition()
+        self._notified = {}  # Task id mapped to receive time and latency
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        """ Receives notifications in a background thread """
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._thread.join()
+
+    def subscribe(self, dnac, name='dnac-tasks', event_ids=None):
+        """ Subscribes receiver URL to task notifications of DNA Center,
+        unless subscribed already. Returns the existing subscription or the
+        response of the new one """
+        event_ids = event_ids or TASK_EVENTS
+        for subscription in dnac.get('event/subscription',
+                                     ver='dna/intent/api/v1'):
+            urls = [e.get('subscriptionDetails', {}).get('url')
+                    for e in subscription.get('subscriptionEndpoints', [])]
+            if (subscription.get('name') == name and self.url in urls and
+                    sorted(subscription.get('filter', {}).get('eventIds')
+                           or []) == sorted(event_ids)):
+                logging.debug('Reusing subscription %s'
+                              % subscription.get('subscriptionId'))
+                return subscription
+        data = [{"name": name,
+                 "subscriptionEndpoints": [{"subscriptionDetails": {
+                     "connectorType": "REST", "method": "POST",
+                     "url": self.url}}],
+                 "filter": {"eventIds": event_ids}}]
+        return dnac.post('event/subscription', ver='dna/intent/api/v1',
+                         data=data)
+
+    def notify(self, event):
+        """ Registers notification of task completion """
+        # Task id is nested in the event details
+        found = next((obj for _, obj in walk(event) if 'taskId' in obj),
+                     None)
+        if found is None:
+            logging.debug('Notification without task id: %s'
+                          % json.dumps(event))
+            return
+        now = time.time()
+        end_time = found.get('endTime') or (event.get('timestamp')
+                                            if isinstance(event, dict)
+                                            else None)
+        # Time between task completion and receipt of notification
+        latency = now - float(end_time) / 1000 if end_time else None
+        with self._cond:
+            self._notified[found['taskId']] = (now, latency)
+            self.count += 1
+            self.last = now
+            # Forget notifications of tasks nobody waits on
+            for task_id, (received, _) in list(self._notified.items()):
+                if received + self.retention < now:
+                    del self._notified[task_id]
+            self._cond.notify_all()
+        logging.info('TASK %s notified' % found['taskId'])
+
+    def active(self):
+        """ Returns true if a notification was received recently """
+        return self.last is not None and self.last + self.window > time.time()
+
+    def fallback(self, interval):
+        """ Returns seconds to wait for a notification before polling """
+        return interval * self.factor if self.active() else interval
+
+    def wait(self, task_ids, timeout):
+        """ Waits until completion of any of the tasks is notified or until
+        timeout, returns list of notified task id and latency tuples """
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                notified = [(task_id, self._notified.pop(task_id)[1])
+                            for task_id in task_ids
+                            if task_id in self._notified]
+                remaining = deadline - time.time()
+                if notified or remaining <= 0:
+                    return notified
+                self._cond.wait(remaining)
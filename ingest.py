@@ -0,0 +1,125 @@
+"""
+This module implements validation of csv change files read in chunks, so
+that errors of all rows are known before anything is changed
+
+Basic Usage:
+
+  devices = dna.Index(dnac.get_all('network-device'))
+  ingest = Ingest('cfs-import.csv', 'Hostname')
+  ingest.reference('Hostname', devices, 'hostname')
+  ingest.check(lambda row: None if row['Interface'] else 'no interface')
+  if ingest.run().errors:
+      ingest.report()
+  for hostname, rows in ingest.groups.items():
+      for line, row in rows:
+          ...
+
+Each chunk is checked against an Index per referenced column using a single
+set operation on the distinct values in that chunk.
+"""
+
+# Author: Tim Dorssers
+
+import csv
+import ipaddress
+from itertools import islice
+from collections import OrderedDict
+
+def read_chunks(filename, delimiter=",", chunk_size=10000):
+    """ Yields lists of up to chunk_size line number and row tuples """
+    with open(filename) as csvfile:
+        reader = csv.DictReader(csvfile, delimiter=delimiter)
+        while True:
+            chunk = [(reader.line_num, row)
+                     for row in islice(reader, chunk_size)]
+            if not chunk:
+                break
+            yield chunk
+
+def missing(chunk, column, index, key):
+    """ Returns line number and message of rows in chunk referring to a
+    value of column not found in index by key. Empty values are ignored """
+    table = index.table(key)
+    values = set(row[column] for _, row in chunk)
+    unknown = set(val for val in values if val != "" and val not in table)
+    return [(line, "%s %s not found" % (column, row[column]))
+            for line, row in chunk if row[column] in unknown]
+
+def overlaps(networks):
+    """ Returns pairs of labels of all overlapping networks, networks is a
+    list of ipaddress network and label tuples. Networks are sorted by
+    address and swept once, instead of being compared with each other. As
+    networks are either nested or disjoint, those containing the current one
+    are kept on a stack """
+    result = []
+    stack = []  # Networks containing the current network and their labels
+    for network, label in sorted(networks, key=lambda n: (n[0].version,
+                                                          n[0])):
+        while stack and (stack[-1][0].version != network.version or
+                         network.network_address >
+                         stack[-1][0].broadcast_address):
+            stack.pop()
+        result.extend((other, label) for _, other in stack)
+        stack.append((network, label))
+    return result
+
+def network(cidr):
+    """ Returns ipaddress network of CIDR string, raises ValueError """
+    return ipaddress.ip_network(cidr)
+
+class Ingest(object):
+    """ Reads csv file in chunks, validates rows and groups them by value
+    of a column. Errors of all rows are collected with their line number """
+
+    def __init__(self, filename, group_by, delimiter=",", chunk_size=10000):
+        self.filename = filename
+        self.group_by = group_by
+        self.delimiter = delimiter
+        self.chunk_size = chunk_size
+        self.groups = OrderedDict()
+        self.errors = []
+        self.count = 0
+        self._references = []
+        self._checks = []
+
+    def reference(self, column, index, key):
+        """ Adds check of column values referring to objects in index """
+        self._references.append((column, index, key))
+
+    def check(self, func):
+        """ Adds check function of row returning error message or None """
+        self._checks.append(func)
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+    def run(self):
+        """ Validates and groups all rows, returns self """
+        columns = set([self.group_by] + [r[0] for r in self._references])
+        for chunk in read_chunks(self.filename, self.delimiter,
+                                 self.chunk_size):
+            if not self.count:  # Header is known once the first row is read
+                absent = columns - set(chunk[0][1])
+                if absent:
+                    self.error(1, "missing columns " +
+                               ", ".join(sorted(absent)))
+                    return self
+            self.count += len(chunk)
+            for column, index, key in self._references:
+                for line, message in missing(chunk, column, index, key):
+                    self.error(line, message)
+            for line, row in chunk:
+                for func in self._checks:
+                    message = func(row)
+                    if message:
+                        self.error(line, message)
+                self.groups.setdefault(row[self.group_by], []).append(
+                    (line, row))
+        return self
+
+    def report(self):
+        """ Prints errors sorted by line number """
+        for line, message in sorted(self.errors):
+            print("Line %d: %s" % (line, message))
+        print("%d errors in %d rows of %s, nothing changed"
+              % (len(self.errors), self.count, self.filename))
@@ -0,0 +1,118 @@
+"""
+This module implements a journal of bulk operations, so that an interrupted
+run can be resumed without repeating completed work
+
+Basic Usage:
+
+  with journal.Journal('pool-import.csv.journal', resume=True) as jrnl:
+      for row in rows:
+          if jrnl.completed(row['IP Pool Name']):
+              continue
+          result = jrnl.run_task(dnac, row['IP Pool Name'], 'add',
+                                 lambda: dnac.post('ippool', data=...))
+          jrnl.record(row['IP Pool Name'], 'completed', id=result.progress)
+
+Records are appended to a file of JSON lines and flushed one at a time. A
+task submitted by a previous run is polled again instead of submitted
+again, and the result of a finished step is taken from the journal.
+"""
+
+# Author: Tim Dorssers
+
+import os
+import json
+import time
+import threading
+from dna import JsonObj, TaskError
+
+class Journal(object):
+    """ Implements an append-only journal of submitted tasks and outcomes
+    per key, for instance a csv file row, and per step of that key """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.resume = resume
+        self.records = {}  # Key mapped to list of records
+        self._lock = threading.Lock()
+        self._file = None
+        self._newline = False
+        if resume and os.path.isfile(path):
+            with open(path) as f:
+                line = ''
+                for line in f:
+                    try:
+                        record = json.loads(line, object_hook=JsonObj)
+                    except ValueError:
+                        continue  # Line was cut short by a crash
+                    self.records.setdefault(record.key, []).append(record)
+                # Terminate line cut short before appending
+                self._newline = line != '' and not line.endswith('\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    def record(self, key, state, step=None, **fields):
+        """ Appends record of key to the journal file """
+        record = JsonObj(fields, time=time.time(), key=key, state=state,
+                         step=step)
+        with self._lock:
+            # File is opened on first record, a new run truncates it
+            if self._file is None:
+                self._file = open(self.path, 'a' if self.resume else 'w')
+                if self._newline:
+                    self._file.write('\n')
+            self.records.setdefault(key, []).append(record)
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+
+    def last(self, key, step=None):
+        """ Returns last record of key, of the given step if any """
+        return next((r for r in reversed(self.records.get(key, []))
+                     if step is None or r.step == step), None)
+
+    def completed(self, key):
+        """ Returns true if key was completed """
+        record = self.last(key)
+        return record is not None and record.state == 'completed'
+
+    def task(self, key, step):
+        """ Returns id of task of step submitted without outcome or None """
+        record = self.last(key, step)
+        if record is not None and record.state == 'submitted':
+            return record.taskId
+        return None
+
+    def result(self, key, step):
+        """ Returns task result of finished step or None """
+        record = self.last(key, step)
+        if record is not None and record.state == 'finished':
+            return record.result
+        return None
+
+    def run_task(self, dnac, key, step, submit, **kwargs):
+        """ Returns task result of step of key. The result of a finished
+        step is returned from the journal, a task without outcome is polled
+        again, otherwise submit is called to start the task. Keyword
+        arguments are passed to wait_on_task """
+        result = self.result(key, step)
+        if result is not None:
+            return result
+        task_id = self.task(key, step)
+        if task_id is None:
+            task_id = submit().response.taskId
+            self.record(key, 'submitted', step, taskId=task_id)
+        try:
+            result = dnac.wait_on_task(task_id, **kwargs).response
+        except TaskError as e:
+            # Task has failed and is submitted again by the next run
+            self.record(key, 'failed', step, taskId=task_id, error=str(e))
+            raise
+        self.record(key, 'finished', step, taskId=task_id, result=result)
+        return result
@@ -1,27 +1,13 @@
 """ Script to add root and reserve sub IP pools from a csv file """
 
-from __future__ import print_function
 import json
 import logging
-import csv
 import re
+import sys
 import dna
-
-HOST = ""
-USERNAME = ""
-PASSWORD = ""
-CSVFILE = "pool-import.csv"
-DELIMIT = ","
-LOGGING = True
-
-def lookup(list_dicts, key, val):
-    """ Find key by value in list of dicts and return dict """
-    if val == "":
-        return None
-    r = next((d for d in list_dicts if d[key] == val), None)
-    if r is None:
-        raise(ValueError(val + " not found"))
-    return r
+import ingest
+import journal
+from multiprocessing.pool import ThreadPool
 
 def make_list(s):
     """ Split on whitespace and comma """
@@ -31,84 +17,218 @@ def make_bool(s):
     """ Convert string to bool """
     return True if s.lower() == 'true' else False
 
-def main():
-    if LOGGING:
-        logging.basicConfig(level=logging.DEBUG,
-                            format='%(asctime)s - %(levelname)s - %(message)s')
-    with open(CSVFILE) as csvfile:
-        rows = [row for row in csv.DictReader(csvfile, delimiter=DELIMIT)]
-    with dna.Dnac(HOST) as dnac:
-        dnac.login(USERNAME, PASSWORD)
-        # Get fabric domains, virtual networks and virtual network contexts
-        ippools = dnac.get("ippool", ver="api/v2").response
-        sites = dnac.get("group", params={"groupType": "SITE"}).response
-        for row in rows:
-            parent = lookup(ippools, "ipPoolName", row["Parent Pool"])
-            site = lookup(sites, "groupNameHierarchy", row["Site"])
-            # Reserve sub pool
-            if parent is not None:
-                print("Reserving %s" % row["IP Pool Name"])
-                # Request body for new sub pool
-                data = {"ipPoolName": row["IP Pool Name"],
-                        "ipPoolOwner": "DNAC",
-                        "ipPoolCidr": row["IP Pool CIDR"],
-                        "parentUuid": parent.id,
-                        "shared": True,
-                        "overlapping": make_bool(row["Overlapping"]),
-                        "context": [{"contextKey": "siteId",
-                                     "contextValue": site.id}],
+def reserve_pool(dnac, jrnl, row, parent, site):
+    """ Reserves sub pool and returns task durations """
+    key = row["IP Pool Name"]
+    # Request body for new sub pool
+    data = {"ipPoolName": row["IP Pool Name"],
+            "ipPoolOwner": "DNAC",
+            "ipPoolCidr": row["IP Pool CIDR"],
+            "parentUuid": parent.id,
+            "shared": True,
+            "overlapping": make_bool(row["Overlapping"]),
+            "context": [{"contextKey": "siteId",
+                         "contextValue": site.id}],
+            "dhcpServerIps": make_list(row["DHCP Servers"]),
+            "dnsServerIps": make_list(row["DNS Servers"]),
+            "gateways": make_list(row["Gateway"])}
+    # Commit request
+    logging.debug("data=" + json.dumps(data))
+    task_result = jrnl.run_task(dnac, key, "subpool", lambda: dnac.post(
+        "ippool/subpool", ver="api/v2", data=data))
+    seconds = [float(task_result.endTime - task_result.startTime) / 1000]
+    # Make object reference for GUI
+    data = [{"groupUuid": site.id,
+             "instanceType": "reference",
+             "key": "ip.pool.%s.%s" % (row["Type"].lower(),
+                                       task_result.progress),
+             "namespace": "global",
+             "type": "reference.setting",
+             "value": [{"objReferences": [task_result.progress],
+                        "type": row["Type"].lower(),
+                        "url": ""}]}]
+    # Commit request
+    logging.debug("data=" + json.dumps(data))
+    task_result = jrnl.run_task(dnac, key, "setting", lambda: dnac.post(
+        "commonsetting/global/" + site.id, data=data))
+    seconds.append(float(task_result.endTime - task_result.startTime) / 1000)
+    return None, seconds
+
+def add_pool(dnac, jrnl, row):
+    """ Creates root pool and returns it along with task duration """
+    # Request body for new IP pool
+    data = dna.JsonObj({"ipPoolCidr": row["IP Pool CIDR"],
+                        "ipPoolName": row["IP Pool Name"],
                         "dhcpServerIps": make_list(row["DHCP Servers"]),
                         "dnsServerIps": make_list(row["DNS Servers"]),
-                        "gateways": make_list(row["Gateway"])}
-                # Commit request
-                logging.debug("data=" + json.dumps(data))
-                response = dnac.post("ippool/subpool", ver="api/v2",
-                                     data=data).response
-                print("Waiting for Task")
-                task_result = dnac.wait_on_task(response.taskId).response
-                print("Completed in %s seconds" % (float(task_result.endTime
-                                                   - task_result.startTime)
-                                                   / 1000))
-                # Make object reference for GUI
-                data = [{"groupUuid": site.id,
-                         "instanceType": "reference",
-                         "key": "ip.pool.%s.%s" % (row["Type"].lower(),
-                                                   task_result.progress),
-                         "namespace": "global",
-                         "type": "reference.setting",
-                         "value": [{"objReferences": [task_result.progress],
-                                    "type": row["Type"].lower(),
-                                    "url": ""}]}]
-                # Commit request
-                logging.debug("data=" + json.dumps(data))
-                response = dnac.post("commonsetting/global/" + site.id,
-                                     data=data).response
-                print("Waiting for Task")
-                task_result = dnac.wait_on_task(response.taskId).response
-                print("Completed in %s seconds" % (float(task_result.endTime
-                                                   - task_result.startTime)
-                                                   / 1000))
-            # Create root pool
+                        "gateways": make_list(row["Gateway"]),
+                        "overlapping": make_bool(row["Overlapping"])})
+    # Commit request
+    logging.debug("data=" + json.dumps(data))
+    task_result = jrnl.run_task(dnac, row["IP Pool Name"], "ippool",
+                                lambda: dnac.post("ippool", ver="api/v2",
+                                                  data=data))
+    # Task result returns new ip pool id
+    data.id = task_result.progress
+    return data, [float(task_result.endTime - task_result.startTime) / 1000]
+
+def check_cidr(row):
+    """ Returns error message if CIDR of row is not a valid network """
+    try:
+        ingest.network(row["IP Pool CIDR"])
+    except ValueError as e:
+        return "IP Pool CIDR %s" % e
+
+def check_pools(rows, ippools, ignore=()):
+    """ Adds errors of rows having an unknown parent pool, of sub pools not
+    within their parent pool and of pools overlapping a sibling pool, unless
+    overlapping is allowed. Rows of pools that exist with the same name and
+    CIDR are reported as such. Existing pools named in ignore are not
+    checked for overlap """
+    roots = dict((row["IP Pool Name"], row)
+                 for _, row in rows.groups.get("", []))
+    for parent, children in rows.groups.items():
+        # Find parent network and existing pools having the same parent
+        existing = ippools.get("ipPoolName", parent)
+        if parent == "":
+            parent_net = None
+            siblings = [p for p in ippools if not p.get("parentUuid")]
+        elif parent in roots:
+            if check_cidr(roots[parent]):
+                continue  # Reported already
+            parent_net = ingest.network(roots[parent]["IP Pool CIDR"])
+            siblings = []
+        elif existing is not None:
+            parent_net = ingest.network(existing.ipPoolCidr)
+            siblings = ippools.find_all("parentUuid", existing.id)
+        else:
+            for line, _ in children:
+                rows.error(line, "Parent Pool %s not found" % parent)
+            continue
+        # Labels are line number, name and CIDR, line 0 is an existing pool
+        networks = [(ingest.network(p.ipPoolCidr),
+                     (0, p.ipPoolName, str(ingest.network(p.ipPoolCidr))))
+                    for p in siblings if not p.get("overlapping")
+                    and p.ipPoolName not in ignore]
+        for line, row in children:
+            if check_cidr(row):
+                continue  # Reported already
+            net = ingest.network(row["IP Pool CIDR"])
+            if parent_net is not None and not (
+                    net.version == parent_net.version and
+                    parent_net.network_address <= net.network_address and
+                    net.broadcast_address <= parent_net.broadcast_address):
+                rows.error(line, "IP Pool CIDR %s not within %s"
+                           % (net, parent_net))
+            if not make_bool(row["Overlapping"]):
+                networks.append((net, (line, row["IP Pool Name"], str(net))))
+        # Report overlap on the line of the last pool of each pair
+        for first, second in ingest.overlaps(networks):
+            first, second = sorted([first, second])
+            if not second[0]:
+                continue
+            if first[0] == 0 and first[1:] == second[1:]:
+                rows.error(second[0], "IP Pool %s already exists"
+                           % second[1])
+            else:
+                rows.error(second[0], "IP Pool %s overlaps %s"
+                           % (second[1], first[1]))
+
+def add_arguments(parser):
+    """ Adds command line arguments of this script """
+    parser.add_argument("csvfile", nargs="?", default="pool-import.csv")
+    parser.add_argument("--delimiter", default=",")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="number of pools added or reserved in parallel")
+    parser.add_argument("--chunk-size", type=int, default=10000,
+                        help="number of csv file rows validated at once")
+    parser.add_argument("--check", action="store_true",
+                        help="validate csv file without adding pools")
+    parser.add_argument("--journal", help="journal file of submitted tasks "
+                                          "and outcomes, defaults to csv "
+                                          "file name with .journal appended")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip pools completed by a previous run and "
+                             "poll its unfinished tasks again")
+
+def run(dnac, args):
+    # Get IP pools and sites
+    ippools = dna.Index(dnac.get("ippool", ver="api/v2").response)
+    sites = dna.Index(dnac.get("group",
+                               params={"groupType": "SITE"}).response)
+    # Validate csv file rows in chunks and group them by parent pool
+    rows = ingest.Ingest(args.csvfile, "Parent Pool", args.delimiter,
+                         args.chunk_size)
+    rows.reference("Site", sites, "groupNameHierarchy")
+    rows.check(check_cidr)
+    rows.run()
+    jrnl = journal.Journal(args.journal or args.csvfile + ".journal",
+                           args.resume)
+    # Pools completed by a previous run are skipped, pools of which tasks
+    # were submitted already are not checked for overlap
+    for children in rows.groups.values():
+        children[:] = [(line, row) for line, row in children
+                       if not jrnl.completed(row["IP Pool Name"])]
+    remaining = sum(len(children) for children in rows.groups.values())
+    if remaining < rows.count:
+        print("Skipped %d pools completed by previous run"
+              % (rows.count - remaining))
+    check_pools(rows, ippools, jrnl.records)
+    if rows.errors:
+        rows.report()
+        return
+    if args.check:
+        print("%d rows of %s are valid" % (rows.count, args.csvfile))
+        return
+    def worker(row):
+        try:
+            parent = ippools.lookup("ipPoolName", row["Parent Pool"])
+            if parent is not None:
+                site = sites.lookup("groupNameHierarchy", row["Site"])
+                result = reserve_pool(dnac, jrnl, row, parent, site)
             else:
-                print("Adding %s" % row["IP Pool Name"])
-                # Request body for new IP pool
-                data = dna.JsonObj({"ipPoolCidr": row["IP Pool CIDR"],
-                            "ipPoolName": row["IP Pool Name"],
-                            "dhcpServerIps": make_list(row["DHCP Servers"]),
-                            "dnsServerIps": make_list(row["DNS Servers"]),
-                            "gateways": make_list(row["Gateway"]),
-                            "overlapping": make_bool(row["Overlapping"])})
-                # Commit request
-                logging.debug("data=" + json.dumps(data))
-                response = dnac.post("ippool", ver="api/v2", data=data).response
-                print("Waiting for Task")
-                task_result = dnac.wait_on_task(response.taskId).response
-                print("Completed in %s seconds" % (float(task_result.endTime
-                                                   - task_result.startTime)
-                                                   / 1000))
-                # Task result returns new ip pool id
-                data.id = task_result.progress
-                ippools.append(data)
+                result = add_pool(dnac, jrnl, row)
+            jrnl.record(row["IP Pool Name"], "completed")
+            return row, result
+        except Exception as e:
+            return row, e
+    # Rows are processed in rounds, sub pools become ready once their
+    # parent pool exists, and rows of each round run concurrently
+    pending = rows.groups
+    take = lambda names: [row for name in names
+                          for _, row in pending.pop(name, [])]
+    ready = take([name for name in pending
+                  if name == "" or ippools.get("ipPoolName", name)])
+    failed = []
+    pool = ThreadPool(args.workers)
+    try:
+        while ready:
+            added = []
+            for row, result in pool.imap_unordered(worker, ready):
+                action = "Reserving" if row["Parent Pool"] else "Adding"
+                print("%s %s" % (action, row["IP Pool Name"]))
+                if isinstance(result, Exception):
+                    print("Failed:", result)
+                    failed.append(row["IP Pool Name"])
+                    continue
+                data, seconds = result
+                for s in seconds:
+                    print("Completed in %s seconds" % s)
+                if data is not None:
+                    ippools.append(data)
+                    added.append(data.ipPoolName)
+            ready = take(added)
+    finally:
+        pool.terminate()
+        jrnl.close()
+    # Sub pools of failed parent pools are skipped
+    for parent, children in pending.items():
+        for _, row in children:
+            print("Skipped %s, parent pool %s failed" % (row["IP Pool Name"],
+                                                         parent))
+    if failed:
+        print("Failed:", *failed)
 
 if __name__ == "__main__":
-    main()
+    import dnac as cli
+    cli.main(sys.argv[1:], "pool-import")
@@ -0,0 +1,263 @@
+"""
+This module implements a local SQLite snapshot of DNA Center state for
+offline queries and reports
+
+Basic Usage:
+
+  with dna.Dnac('https://10.0.0.1/') as dnac:
+      dnac.login('admin', 'password')
+      with snapshot.Snapshot('dnac.db') as snap:
+          snap.refresh(dnac)
+
+  with snapshot.Snapshot('dnac.db') as snap:
+      device = snap.lookup('device', 'hostname', 'switch-1')
+      for interface in snap.all('interface', parent=device.id):
+          print(interface.portName)
+
+Objects are stored as JSON documents indexed by kind, id, name, hostname and
+parent device id. A refresh only writes objects that changed since the last
+refresh. Interfaces are fetched per device in parallel and DeviceInfo of all
+devices at once. As a command:
+
+  python dnac.py --host 10.0.0.1 -u admin snapshot dnac.db
+"""
+
+# Author: Tim Dorssers
+
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+from multiprocessing.pool import ThreadPool
+from dna import JsonObj, Index
+
+# Kind, API path, version, query parameters, id key and name key. Kinds
+# having a None path are stored per device
+KINDS = [("device", "network-device", "api/v1", None, "id", "hostname"),
+         ("site", "group", "api/v1", {"groupType": "SITE"}, "id",
+          "groupNameHierarchy"),
+         ("ippool", "ippool", "api/v2", None, "id", "ipPoolName"),
+         ("segment", "data/customer-facing-service/Segment", "api/v2", None,
+          "id", "name"),
+         ("domain", "data/customer-facing-service/ConnectivityDomain",
+          "api/v2", None, "id", "name"),
+         ("sgt", "data/customer-facing-service/scalablegroup", "api/v2",
+          None, "id", "name"),
+         ("siteprofile", "siteprofile", "api/v1", {"populated": "true"},
+          "siteProfileUuid", "name"),
+         ("interface", None, "api/v1", None, "id", "portName"),
+         ("deviceinfo", None, "api/v2", None, "id", "name")]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS object (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT,
+    hostname TEXT,
+    parent TEXT,
+    hash TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (kind, id));
+CREATE INDEX IF NOT EXISTS object_name ON object (kind, name);
+CREATE INDEX IF NOT EXISTS object_hostname ON object (kind, hostname);
+CREATE INDEX IF NOT EXISTS object_parent ON object (kind, parent);
+CREATE TABLE IF NOT EXISTS refresh (
+    kind TEXT PRIMARY KEY,
+    time REAL NOT NULL,
+    count INTEGER NOT NULL);
+"""
+
+class Snapshot(object):
+    """ Implements a local store of DNA Center objects """
+
+    # Columns that objects can be selected by
+    columns = ("id", "name", "hostname", "parent")
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.kinds = dict((k[0], k[1:]) for k in KINDS)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def refresh(self, dnac, kinds=None, workers=8):
+        """ Fetches objects of all or the given kinds and stores changes.
+        Returns counts of added, changed, removed and unchanged objects per
+        kind """
+        kinds = kinds or [k[0] for k in KINDS]
+        summary = JsonObj()
+        if "device" in kinds or "interface" in kinds or "deviceinfo" in kinds:
+            devices = list(dnac.get_all("network-device"))
+            summary["device"] = self._sync("device", devices).pop("counts")
+            # Interfaces and DeviceInfo change independently of the device
+            # record, so they are fetched for all devices
+            if "interface" in kinds:
+                summary["interface"] = self._refresh_interfaces(
+                    dnac, devices, workers)
+            if "deviceinfo" in kinds:
+                summary["deviceinfo"] = self._refresh_device_info(dnac,
+                                                                  devices)
+        for kind in kinds:
+            api, ver, params, _, _ = self.kinds[kind]
+            if api is None or kind == "device":
+                continue
+            response = dnac.get(api, ver=ver, params=params).response
+            summary[kind] = self._sync(kind, response).pop("counts")
+        return summary
+
+    def _refresh_interfaces(self, dnac, devices, workers):
+        """ Fetches interfaces of all devices in parallel """
+        def fetch(device):
+            return device, dnac.get("interface/network-device/" +
+                                    device.id).response
+        pool = ThreadPool(workers)
+        try:
+            return self._sync_devices("interface", devices,
+                                      pool.imap_unordered(fetch, devices))
+        finally:
+            pool.close()
+
+    def _refresh_device_info(self, dnac, devices):
+        """ Fetches DeviceInfo of all devices in pages """
+        infos = {}
+        for info in dnac.get_all("data/customer-facing-service/DeviceInfo",
+                                 ver="api/v2"):
+            infos.setdefault(info.get("networkDeviceId"), []).append(info)
+        return self._sync_devices("deviceinfo", devices,
+                                  ((d, infos.get(d.id, [])) for d in devices))
+
+    def _sync_devices(self, kind, devices, fetched):
+        """ Stores objects of kind from device and objects tuples and removes
+        objects of devices no longer in inventory. Returns counts of added,
+        changed, removed and unchanged objects """
+        counts = JsonObj(added=0, changed=0, removed=0, unchanged=0)
+        for device, objs in fetched:
+            for key, val in self._sync(kind, objs, device)["counts"].items():
+                counts[key] += val
+        device_ids = set(d.id for d in devices)
+        with self.db:
+            parents = [r[0] for r in self.db.execute(
+                "SELECT DISTINCT parent FROM object WHERE kind = ?", (kind,))]
+            for parent in parents:
+                if parent not in device_ids:
+                    counts.removed += self.db.execute(
+                        "DELETE FROM object WHERE kind = ? AND parent = ?",
+                        (kind, parent)).rowcount
+            self.db.execute("INSERT OR REPLACE INTO refresh VALUES (?, ?, ?)",
+                            (kind, time.time(), counts.added + counts.changed
+                             + counts.unchanged))
+        return counts
+
+    def _sync(self, kind, objs, device=None):
+        """ Stores objects of kind, scoped to a parent device if given, and
+        removes stored objects not in objs. Returns ids of added, changed
+        and removed objects and their counts """
+        _, _, _, id_key, name_key = self.kinds[kind]
+        if device is None:
+            where, args = "kind = ?", (kind,)
+            hostname = parent = None
+        else:
+            where, args = "kind = ? AND parent = ?", (kind, device.id)
+            hostname, parent = device.hostname, device.id
+        hashes = dict(self.db.execute("SELECT id, hash FROM object WHERE "
+                                      + where, args))
+        result = {"added": [], "changed": [], "removed": [], "unchanged": 0}
+        rows = []
+        for obj in objs:
+            data = json.dumps(obj, sort_keys=True, separators=(',', ':'))
+            # Hostname is part of the hash, as it is stored with the object
+            digest = hashlib.sha1((data + str(hostname)).encode('utf-8'))
+            digest = digest.hexdigest()
+            obj_id = obj[id_key]
+            old = hashes.pop(obj_id, None)
+            if old == digest:
+                result["unchanged"] += 1
+                continue
+            result["added" if old is None else "changed"].append(obj_id)
+            rows.append((kind, obj_id, obj.get(name_key),
+                         obj.get("hostname", hostname), parent, digest, data))
+        result["removed"] = list(hashes)
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO object VALUES "
+                                "(?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.executemany("DELETE FROM object WHERE kind = ? AND id = ?",
+                                [(kind, i) for i in result["removed"]])
+            if device is None:
+                self.db.execute("INSERT OR REPLACE INTO refresh VALUES "
+                                "(?, ?, ?)", (kind, time.time(),
+                                              len(rows) + result["unchanged"]))
+        result["counts"] = JsonObj((key, len(val) if isinstance(val, list)
+                                    else val) for key, val in result.items())
+        return result
+
+    def all(self, kind, **where):
+        """ Returns list of objects of kind having the given column values,
+        for instance hostname or parent """
+        for column in where:
+            if column not in self.columns:
+                raise ValueError(column + " is not an indexed column")
+        sql = "SELECT data FROM object WHERE kind = ?" + "".join(
+            " AND %s = ?" % column for column in where)
+        return [json.loads(r[0], object_hook=JsonObj) for r in
+                self.db.execute(sql, (kind,) + tuple(where.values()))]
+
+    def index(self, kind, **where):
+        """ Returns dna.Index of objects of kind """
+        return Index(self.all(kind, **where))
+
+    def get(self, kind, column, val, default=None):
+        """ Returns first object of kind having the value of an indexed
+        column or default """
+        objs = self.all(kind, **{column: val})
+        return objs[0] if objs else default
+
+    def lookup(self, kind, column, val):
+        """ Find object by value of column, raises ValueError if not found """
+        if val == "":
+            return None
+        r = self.get(kind, column, val)
+        if r is None:
+            raise(ValueError(val + " not found"))
+        return r
+
+    def age(self, kind):
+        """ Returns seconds since last refresh of kind or None if never """
+        row = self.db.execute("SELECT time FROM refresh WHERE kind = ?",
+                              (kind,)).fetchone()
+        return time.time() - row[0] if row else None
+
+def add_arguments(parser):
+    """ Adds command line arguments of this script """
+    parser.add_argument("database", nargs="?", default="dnac.db",
+                        help="snapshot file, created if it does not exist")
+    parser.add_argument("--kinds", nargs="+", metavar="KIND",
+                        choices=[k[0] for k in KINDS],
+                        help="object kinds to refresh, all if not specified")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="number of devices fetched in parallel")
+
+def run(dnac, args):
+    start_time = time.time()
+    with Snapshot(args.database) as snap:
+        summary = snap.refresh(dnac, args.kinds, args.workers)
+    fmt = "{:12} {:>10} {:>10} {:>10} {:>10}"
+    print(fmt.format("Kind", "Added", "Changed", "Removed", "Unchanged"))
+    print('-'*56)
+    for kind, counts in summary.items():
+        print(fmt.format(kind, counts.added, counts.changed, counts.removed,
+                         counts.unchanged))
+    print('='*56)
+    print("Refreshed in %.1f seconds" % (time.time() - start_time))
+
+if __name__ == "__main__":
+    import dnac as cli
+    cli.main(sys.argv[1:], "snapshot")
@@ -2,83 +2,167 @@
 Script to provision a user template without using network profiles
 """
 
-from __future__ import print_function
 import dna
 import logging
 import json
 import time
 import base64
+import csv
+import sys
 
-raw_input = vars(__builtins__).get('raw_input', input)  # Py2/3 compatibility
+def interactive(dnac):
+    """ Deploys template selected by user to a device selected by user """
+    # Get available templates
+    templates = dnac.get("template-programmer/template")
+    print("Templates:")
+    for i, template in enumerate(templates):
+        print(i, template.projectName, template.name)
+    print('-'*80)
+    idx = int(input("Select template: "))
+    # Find latest version of selected template
+    latest = max(templates[idx].versionsInfo, key=lambda vi:vi.version)
+    # Get template
+    template = dnac.get("/template-programmer/template/" + latest.id)
+    logging.debug("content=" + template.templateContent)
+    params = {}
+    if template.templateParams:
+        print("Input template parameters:")
+        for tp in template.templateParams:
+            dtype = tp.dataType if tp.dataType else "STRING"
+            dname = tp.displayName if tp.displayName else tp.parameterName
+            # Make list of selection values, if any
+            v = ""
+            if tp.selection:
+                v = ", ".join(iter(tp.selection.selectionValues.values()))
+            if not v:
+                # Make list of value ranges, if any
+                v = (", ".join("%d-%d" % (r.minValue, r.maxValue)
+                               for r in tp.range))
+            # Compose user prompt for parameter value input
+            prompt = ("%s %s [%s]" % (dtype, dname, v) if v else
+                      "%s %s" % (dtype, dname))
+            params[tp.parameterName] = input("%s: " % prompt)
+    else:
+        print("Template takes no parameters")
+    # Get network-devices
+    devices = list(dnac.get_all("network-device"))
+    print("Devices:")
+    for i, device in enumerate(devices):
+        print(i, device.hostname)
+    print('-'*80)
+    idx = int(input("Select device: "))
+    # Verify matching template device type
+    if not dna.find(template.deviceTypes, devices[idx].family,
+                    "productFamily"):
+        print("Device type mismatch")
+        return
+    # Body
+    data = {"targetInfo": [{"id": devices[idx].managementIpAddress,
+                            "type": "MANAGED_DEVICE_IP",
+                            "params": params}],
+            "templateId": latest.id}
+    logging.debug("data=" + json.dumps(data))
+    response = dnac.post("template-programmer/template/deploy",
+                         data=data).response
+    print("Waiting for Task")
+    task_result = dnac.wait_on_task(response.taskId).response
+    print(task_result.progress)
+    print("Completed in %s seconds" % (float(task_result.endTime
+                                       - task_result.startTime) / 1000))
 
-HOST = ""
-USERNAME = ""
-PASSWORD = ""
-LOGGING = False
+def read_targets(filename, delimiter=","):
+    """ Returns list of hostname or IP address and parameters tuples read
+    from a csv file or a json file """
+    with open(filename) as f:
+        if filename.lower().endswith(".json"):
+            return [(t["hostname"], t.get("params", {})) for t in json.load(f)]
+        return [(row.pop("Hostname"), row)
+                for row in csv.DictReader(f, delimiter=delimiter)]
 
-def main():
-    if LOGGING:
-        logging.basicConfig(level=logging.DEBUG,
-                            format='%(asctime)s - %(levelname)s - %(message)s')
-    with dna.Dnac(HOST) as dnac:
-        dnac.login(USERNAME, PASSWORD)
-        # Get available templates
-        templates = dnac.get("template-programmer/template")
-        print("Templates:")
-        for i, template in enumerate(templates):
-            print(i, template.projectName, template.name)
-        print('-'*80)
-        idx = int(raw_input("Select template: "))
-        # Find latest version of selected template
-        latest = max(templates[idx].versionsInfo, key=lambda vi:vi.version)
-        # Get template
-        template = dnac.get("/template-programmer/template/" + latest.id)
-        logging.debug("content=" + template.templateContent)
-        params = {}
-        if template.templateParams:
-            print("Input template parameters:")
-            for tp in template.templateParams:
-                dtype = tp.dataType if tp.dataType else "STRING"
-                dname = tp.displayName if tp.displayName else tp.parameterName
-                # Make list of selection values, if any
-                v = ""
-                if tp.selection:
-                    v = ", ".join(iter(tp.selection.selectionValues.values()))
-                if not v:
-                    # Make list of value ranges, if any
-                    v = (", ".join("%d-%d" % (r.minValue, r.maxValue)
-                                   for r in tp.range))
-                # Compose user prompt for parameter value input
-                prompt = ("%s %s [%s]" % (dtype, dname, v) if v else
-                          "%s %s" % (dtype, dname))
-                params[tp.parameterName] = raw_input("%s: " % prompt)
+def bulk(dnac, args):
+    """ Deploys template to all target devices in batches """
+    # Find template by name and version, latest version if not specified
+    templates = dna.Index(dnac.get("template-programmer/template"))
+    versions = templates.lookup("name", args.template).versionsInfo
+    if args.version:
+        version = next((vi for vi in versions
+                        if str(vi.version) == args.version), None)
+        if version is None:
+            raise(ValueError(args.version + " not found"))
+    else:
+        version = max(versions, key=lambda vi:vi.version)
+    template = dnac.get("template-programmer/template/" + version.id)
+    families = dna.Index(template.deviceTypes)
+    names = set(tp.parameterName for tp in template.templateParams or [])
+    devices = dna.Index(dnac.get_all("network-device"))
+    # Validate all targets before deploying
+    targets = []
+    errors = []
+    for hostname, params in read_targets(args.targets, args.delimiter):
+        device = (devices.get("hostname", hostname) or
+                  devices.get("managementIpAddress", hostname))
+        if device is None:
+            errors.append(hostname + " not found")
+        elif not families.get("productFamily", device.family):
+            errors.append(hostname + " device type mismatch")
+        elif names - set(params):
+            errors.append(hostname + " missing parameters " +
+                          ", ".join(sorted(names - set(params))))
         else:
-            print("Template takes no parameters")
-        # Get network-devices
-        devices = dnac.get("network-device").response
-        print("Devices:")
-        for i, device in enumerate(devices):
-            print(i, device.hostname)
-        print('-'*80)
-        idx = int(raw_input("Select device: "))
-        # Verify matching template device type
-        if not dna.find(template.deviceTypes, devices[idx].family,
-                        "productFamily"):
-            print("Device type mismatch")
-            return
-        # Body
-        data = {"targetInfo": [{"id": devices[idx].managementIpAddress,
-                                "type": "MANAGED_DEVICE_IP",
-                                "params": params}],
-                "templateId": latest.id}
+            targets.append({"id": device.managementIpAddress,
+                            "type": "MANAGED_DEVICE_IP",
+                            "params": params})
+    if errors:
+        print(*errors, sep="\n")
+        return
+    # Deploy to as many targets per request as allowed
+    task_ids = []
+    for i in range(0, len(targets), args.batch):
+        data = {"targetInfo": targets[i:i + args.batch],
+                "templateId": version.id}
         logging.debug("data=" + json.dumps(data))
         response = dnac.post("template-programmer/template/deploy",
                              data=data).response
-        print("Waiting for Task")
-        task_result = dnac.wait_on_task(response.taskId).response
+        task_ids.append(response.taskId)
+    print("Waiting for %d Tasks" % len(task_ids))
+    failed = 0
+    for task_id, result in dnac.wait_on_tasks(task_ids, raise_errors=False):
+        if isinstance(result, Exception):
+            print("Failed:", result)
+            failed += 1
+            continue
+        task_result = result.response
         print(task_result.progress)
         print("Completed in %s seconds" % (float(task_result.endTime
                                            - task_result.startTime) / 1000))
-        
+    print("Deployed to %d devices in %d batches, %d failed"
+          % (len(targets), len(task_ids), failed))
+
+def add_arguments(parser):
+    """ Adds command line arguments of this script """
+    parser.add_argument("--template",
+                        help="template deployed in bulk to all targets")
+    parser.add_argument("--version", help="template version, latest if "
+                                          "not specified")
+    parser.add_argument("--targets", help="csv or json file of target "
+                                          "devices and parameters, template "
+                                          "is selected interactively if not "
+                                          "specified")
+    parser.add_argument("--delimiter", default=",")
+    parser.add_argument("--batch", type=int, default=100,
+                        help="number of target devices per deploy request")
+
+def check_arguments(parser, args):
+    """ Reports invalid combinations of command line arguments """
+    if args.targets and not args.template:
+        parser.error("--targets requires --template")
+
+def run(dnac, args):
+    if args.targets:
+        bulk(dnac, args)
+    else:
+        interactive(dnac)
+
 if __name__ == "__main__":
-    main()
+    import dnac as cli
+    cli.main(sys.argv[1:], "template")
@@ -0,0 +1,250 @@
+""" Unit tests of the dna module and sample scripts, run with python -m
+unittest test_dna """
+
+# Author: Tim Dorssers
+
+import sys
+import json
+import shutil
+import importlib
+import tempfile
+import unittest
+import threading
+import dna
+import dnasim
+import ingest
+
+class StreamDecoderTest(unittest.TestCase):
+
+    def check(self, text):
+        expected = json.loads(text)["response"]
+        if not isinstance(expected, list):  # Yielded as single element
+            expected = [expected]
+        for size in range(1, len(text) + 1):
+            chunks = [text[i:i + size] for i in range(0, len(text), size)]
+            self.assertEqual(list(dna._iter_response(chunks)), expected,
+                             "chunk size %d" % size)
+
+    def test_numbers(self):
+        self.check('{"response": [12345678901234567890, -0.5, 1e-07, '
+                   '3.25E+10, -12, 0]}')
+
+    def test_objects(self):
+        self.check('{"version": "1.0", "response": [{"id": "a", "x": '
+                   '[true, false, null]}, {"id": "b", "n": -1.5e3}, '
+                   '"text", [], {}]}')
+
+    def test_scalar_response(self):
+        self.check('{"response": -0.125, "version": "1.0"}')
+
+class FindTest(unittest.TestCase):
+
+    doc = {"id": "root", "tags": [{"id": "t1"}], "versions": [
+        {"id": "v1", "name": "x"}, {"id": "v2", "name": "y", "meta": {
+            "id": "m1", "name": "x"}}], "owner": {"id": "o1", "name": "x"}}
+
+    def test_find_later_list(self):
+        # Search continues after the first list valued attribute
+        self.assertEqual(dna.find(self.doc, "v2")["name"], "y")
+
+    def test_find_nested_dict(self):
+        self.assertEqual(dna.find(self.doc, "m1")["name"], "x")
+        self.assertEqual(dna.find(self.doc, "o1")["name"], "x")
+        self.assertIsNone(dna.find(self.doc, "missing"))
+
+    def test_find_all(self):
+        expected = [(("versions", 0), {"id": "v1", "name": "x"}),
+                    (("versions", 1, "meta"), {"id": "m1", "name": "x"}),
+                    (("owner",), {"id": "o1", "name": "x"})]
+        self.assertEqual(dna.find_all(self.doc, "x", "name", paths=True),
+                         expected)
+        self.assertEqual(dna.find_all(self.doc, "x", "name"),
+                         [obj for _, obj in expected])
+        index = dna.Index.walk(self.doc)
+        self.assertEqual(index.find_all("name", "x", paths=True), expected)
+        for path, obj in index.find_all("name", "x", paths=True):
+            node = self.doc
+            for key in path:
+                node = node[key]
+            self.assertIs(node, obj)
+
+    def test_deep_nesting(self):
+        depth = sys.getrecursionlimit() * 2
+        doc = leaf = {"id": "leaf"}
+        for i in range(depth):
+            doc = {"id": i, "child": [doc]}
+        self.assertIs(dna.find(doc, "leaf"), leaf)
+        path, obj = dna.find_all(doc, "leaf", paths=True)[0]
+        self.assertEqual(len(path), depth * 2)
+        self.assertIs(dna.Index.walk(doc).get("id", "leaf"), leaf)
+
+class OverlapsTest(unittest.TestCase):
+
+    def overlaps(self, *cidrs):
+        return sorted(ingest.overlaps([(ingest.network(cidr), cidr)
+                                       for cidr in cidrs]))
+
+    def test_nested(self):
+        self.assertEqual(self.overlaps("10.1.2.0/24", "10.0.0.0/8",
+                                       "10.1.0.0/16"),
+                         [("10.0.0.0/8", "10.1.0.0/16"),
+                          ("10.0.0.0/8", "10.1.2.0/24"),
+                          ("10.1.0.0/16", "10.1.2.0/24")])
+
+    def test_disjoint(self):
+        self.assertEqual(self.overlaps("10.0.0.0/24", "10.0.1.0/24",
+                                       "192.168.0.0/16"), [])
+        self.assertEqual(self.overlaps("10.0.0.0/16", "10.1.0.0/24",
+                                       "10.0.5.0/24"),
+                         [("10.0.0.0/16", "10.0.5.0/24")])
+
+    def test_mixed_versions(self):
+        self.assertEqual(self.overlaps("::/0", "10.0.0.0/8", "0.0.0.0/0",
+                                       "2001:db8::/32", "::a00:0/104"),
+                         [("0.0.0.0/0", "10.0.0.0/8"),
+                          ("::/0", "2001:db8::/32"),
+                          ("::/0", "::a00:0/104")])
+
+class HistogramTest(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = dna.Histogram()
+        values = [i / 1000.0 for i in range(1, 10001)]
+        for value in values:
+            histogram.add(value)
+        result = histogram.percentiles()
+        self.assertEqual((result['min'], result['max']), (0.001, 10.0))
+        self.assertAlmostEqual(result['mean'], sum(values) / len(values))
+        for key, expected in (('p50', 5.0), ('p90', 9.0), ('p99', 9.9)):
+            self.assertGreaterEqual(result[key], expected)
+            self.assertLessEqual(result[key], expected * histogram.factor)
+        self.assertLess(len(histogram.buckets), 100)
+
+    def test_empty(self):
+        self.assertEqual(dna.Histogram().percentiles(), {})
+
+class LazyClassTest(unittest.TestCase):
+
+    def test_created_once(self):
+        classes = []
+        threads = [threading.Thread(target=lambda: classes.append(dna.Dnac))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(classes)), 1)
+        self.assertIs(classes[0], dna.Dnac)
+
+class ClientTest(unittest.TestCase):
+
+    def test_scheme(self):
+        with dna.Dnac('http://10.0.0.1/dna') as dnac:
+            self.assertEqual(dnac.base_url, 'https://10.0.0.1')
+        with dna.Dnac('10.0.0.1', scheme='http') as dnac:
+            self.assertEqual(dnac.base_url, 'http://10.0.0.1')
+
+class PaginationTest(unittest.TestCase):
+
+    def test_server_page_limit(self):
+        with dnasim.Simulator(devices=1000, page_limit=100) as sim:
+            with dna.Dnac(sim.url, scheme='http') as dnac:
+                dnac.login('admin', 'admin')
+                devices = list(dnac.get_all('network-device', count=True))
+                self.assertEqual(len(devices), 1000)
+                self.assertEqual(len(set(d.id for d in devices)), 1000)
+                # Without count a short page is taken as the last one
+                self.assertEqual(len(list(dnac.get_all('network-device'))),
+                                 100)
+
+    def test_offset(self):
+        with dnasim.Simulator(devices=250) as sim:
+            with dna.Dnac(sim.url, scheme='http') as dnac:
+                dnac.login('admin', 'admin')
+                pages = list(dnac.iter_pages('network-device', limit=100,
+                                             count=True,
+                                             params={'offset': 51}))
+                self.assertEqual([len(p.response) for p in pages],
+                                 [100, 100])
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_invalidated_on_task_completion(self):
+        with dnasim.Simulator(task_delay=0.2) as sim:
+            with dna.Dnac(sim.url, cache=self.path,
+                          scheme='http') as dnac:
+                dnac.login('admin', 'admin')
+                task_id = dnac.post('ippool', ver='api/v2', data={
+                    'ipPoolName': 'Pool', 'ipPoolCidr': '10.0.0.0/16'}
+                    ).response.taskId
+                # Response cached while the task is running is stale
+                dnac.get('ippool', ver='api/v2')
+                requests = sim.requests
+                dnac.get('ippool', ver='api/v2')
+                self.assertEqual(sim.requests, requests)
+                dnac.wait_on_task(task_id, interval=0.1)
+                requests = sim.requests
+                dnac.get('ippool', ver='api/v2')
+                self.assertEqual(sim.requests, requests + 1)
+
+class CfsImportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cfs = importlib.import_module("cfs-import")
+        self.sim = dnasim.Simulator(devices=1)
+        self.sim.start()
+        self.dnac = dna.Dnac(self.sim.url, scheme='http')
+        self.dnac.login('admin', 'admin')
+
+    def tearDown(self):
+        self.dnac.close()
+        self.sim.stop()
+
+    def apply(self, rows):
+        """ Plans rows of the first device and puts its DeviceInfo """
+        dnac = self.dnac
+        rows = [(line, dict({"Hostname": "switch-0.example.com",
+                             "Authentication": "", "Scalable group": "",
+                             "Data segment": "", "Voice segment": "",
+                             "Device type": ""}, **row))
+                for line, row in enumerate(rows, 2)]
+        di, summary = self.cfs.plan(
+            dnac, "switch-0.example.com", rows,
+            dna.Index(dnac.get_all("network-device")),
+            dna.Index(dnac.get("siteprofile").response),
+            dna.Index(dnac.get("data/customer-facing-service/scalablegroup",
+                               ver="api/v2").response),
+            dna.Index(dnac.get("data/customer-facing-service/Segment",
+                               ver="api/v2").response))
+        dnac.put("data/customer-facing-service/DeviceInfo", ver="api/v2",
+                 data=[di])
+        return summary
+
+    def test_plan_twice(self):
+        port = {"Interface": "GigabitEthernet1/0/2",
+                "Authentication": "Closed Authentication",
+                "Scalable group": "Employees",
+                "Data segment": "10_25_4_0-DEFAULT_VN"}
+        self.assertEqual(self.apply([port])["added"],
+                         ["GigabitEthernet1/0/2"])
+        rows = [{"Interface": "GigabitEthernet1/0/1",
+                 "Data segment": "10_25_5_0-DEFAULT_VN"},
+                {"Interface": "GigabitEthernet1/0/2"}]  # Removal
+        summary = self.apply(rows)
+        self.assertEqual(summary["added"], ["GigabitEthernet1/0/1"])
+        self.assertEqual(summary["removed"], ["GigabitEthernet1/0/2"])
+        summary = self.apply(rows)
+        self.assertEqual(summary["errors"], [])
+        self.assertEqual((summary["added"], summary["updated"],
+                          summary["removed"]), ([], [], []))
+        self.assertEqual(summary["unchanged"], ["GigabitEthernet1/0/1",
+                                                "GigabitEthernet1/0/2"])
+
+if __name__ == "__main__":
+    unittest.main()